@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Measures decode (from str and from bytes) and encode time of installed JSON codecs on CEX.IO frames
+Usage: bench_codec.py [captured frames file, one JSON message per line]
+"""
+
+import sys
+import time
+
+from cexio.codec import *
+from cexio.exceptions import *
+
+from bench.frames import create_frames, load_frames
+
+
+CODECS = ('json', 'ujson', 'rapidjson', 'orjson', )
+
+
+def measure(func, args, number):
+	start = time.perf_counter()
+	for _ in range(number):
+		for arg in args:
+			func(arg)
+	return (time.perf_counter() - start) / number / len(args)
+
+
+def run(frames=None, number=200):
+	if frames is None:
+		frames = {event: [frame] for event, frame in create_frames().items()}
+
+	results = {}
+	for name in CODECS:
+		try:
+			codec = get_codec(name)
+		except ConfigError:
+			continue
+		results[name] = {}
+		for event, event_frames in frames.items():
+			binary = [frame.encode() for frame in event_frames]
+			messages = [codec.loads(frame) for frame in event_frames]
+			results[name][event] = {
+				'loads': measure(codec.loads, event_frames, number),
+				'loads_bytes': measure(codec.loads, binary, number),
+				'dumps': measure(codec.dumps, messages, number),
+			}
+	return results
+
+
+if __name__ == "__main__":
+
+	frames = load_frames(sys.argv[1]) if len(sys.argv) > 1 else None
+	print("{:>10} {:>16} {:>12} {:>12} {:>12}".format('codec', 'event', 'loads, us', 'bytes, us', 'dumps, us'))
+	for name, events in run(frames).items():
+		for event, result in events.items():
+			print("{:>10} {:>16} {:>12.2f} {:>12.2f} {:>12.2f}".format(
+				name, event, result['loads'] * 1e6, result['loads_bytes'] * 1e6, result['dumps'] * 1e6))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Measures frames per second replayed by FrameReplay through CommonWebSocketClient decoding and routing,
+from a log of recorded tick, md and history frames, or of frames captured to file (path argument)
+"""
+
+from asyncio import *
+import itertools
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+from cexio.messaging import *
+from cexio.recorder import *
+from cexio.replay import *
+from cexio.ws_client import *
+
+from .frames import create_frames, load_frames
+
+
+logging.getLogger('cexio.messaging').setLevel(logging.WARNING)
+logging.getLogger('cexio.ws_client').setLevel(logging.WARNING)
+
+
+CONFIG = {'ws': {'uri': 'ws://localhost/', }, 'authorize': False, }
+
+
+def run(frames, count=100000, speed=None):
+	async def handler(message):
+		return message
+
+	directory = tempfile.mkdtemp()
+	try:
+		prefix = os.path.join(directory, 'session')
+		recorder = FrameRecorder(prefix)
+		for frame in itertools.islice(itertools.cycle(frames), count):
+			recorder.record(frame)
+		recorder.close()
+
+		client = CommonWebSocketClient(CONFIG)
+		client.set_router(MessageRouter(
+			[({'e': event, }, handler) for event in ('tick', 'md', 'md_groupped', 'history', 'history-update', )],
+			sink=handler))
+
+		loop = new_event_loop()
+		set_event_loop(loop)
+		try:
+			return loop.run_until_complete(FrameReplay(prefix, client, speed=speed).run())
+		finally:
+			loop.close()
+	finally:
+		shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+
+	if len(sys.argv) > 1:
+		frames = list(itertools.chain.from_iterable(load_frames(sys.argv[1]).values()))
+	else:
+		created = create_frames()
+		frames = [created[event] for event in ('tick', 'tick', 'tick', 'md', 'history-update', 'tick', 'md', 'history')]
+
+	stats = run(frames)
+	print("{:>10} {:>12} {:>12} {:>10}".format('frames', 'frames/s', 'MB/s', 'elapsed'))
+	print("{:>10} {:>12.0f} {:>12.2f} {:>10.3f}".format(
+		stats['frames'], stats['frames_per_s'], stats['bytes_per_s'] / 1e6, stats['elapsed']))
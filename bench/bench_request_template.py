@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Measures time to mark and serialize a request, by dumps() of the request dict, and by RequestTemplate render()
+"""
+
+import copy
+import time
+
+from cexio.codec import *
+from cexio.messaging import *
+
+
+REQUESTS = {
+	'ticker': {'e': 'ticker', 'data': ['BTC', 'USD'], },
+	'get-balance': {'e': 'get-balance', 'data': {}, },
+	'open-orders': {'e': 'open-orders', 'data': {'pair': ['BTC', 'USD'], }, },
+	'place-order': {'e': 'place-order', 'data': {'pair': ['BTC', 'USD'], 'amount': 0.01, 'price': '4000.1', 'type': 'buy', }, },
+}
+
+
+def measure(func, number):
+	start = time.perf_counter()
+	for _ in range(number):
+		func()
+	return (time.perf_counter() - start) / number
+
+
+def run(number=100000, codec_name='auto'):
+	codec = get_codec(codec_name)
+	resolver = RequestResponseFutureResolver(name='', op_name_get_path='e', key_set_path='oid', key_get_path='oid')
+	future = None
+
+	results = {}
+	for event, message in REQUESTS.items():
+		template = RequestTemplate(message, key_path='oid', codec=codec)
+
+		def dumps():
+			codec.dumps(resolver.mark(copy.copy(message), future))
+
+		def render():
+			template.render(resolver.reserve(message, future))
+
+		results[event] = {
+			'dumps': measure(dumps, number),
+			'render': measure(render, number),
+		}
+		dict.clear(resolver)  # no futures to cancel
+	return codec.name, results
+
+
+if __name__ == "__main__":
+
+	name, results = run()
+	print("{:>16} {:>12} {:>12}   codec: {}".format('request', 'dumps, us', 'render, us', name))
+	for event, result in results.items():
+		print("{:>16} {:>12.2f} {:>12.2f}".format(event, result['dumps'] * 1e6, result['render'] * 1e6))
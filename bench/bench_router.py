@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+Measures MessageRouter dispatch cost of a message, which matches the last route in the table,
+for the tables of different size, with linear and indexed (index_path='e') matching
+"""
+
+from asyncio import *
+import logging
+import time
+
+from cexio.messaging import *
+
+
+logging.getLogger('cexio.messaging').setLevel(logging.WARNING)
+
+
+def create_router(size, **kwargs):
+	async def handler(message):
+		return message
+
+	rmap = [({'e': 'event-{}'.format(n), 'data': None, }, handler) for n in range(size)]
+	return MessageRouter(rmap, **kwargs)
+
+
+def measure(router, message, number):
+	async def dispatch():
+		for _ in range(number):
+			await router(message)
+
+	loop = new_event_loop()
+	try:
+		start = time.perf_counter()
+		loop.run_until_complete(dispatch())
+		return (time.perf_counter() - start) / number
+	finally:
+		loop.close()
+
+
+def run(sizes=(4, 16, 64, 256), number=20000):
+	results = {}
+	for size in sizes:
+		message = {'e': 'event-{}'.format(size - 1), 'data': {'price': '1.0', }, }
+		results[size] = {
+			'linear': measure(create_router(size), message, number),
+			'indexed': measure(create_router(size, index_path='e'), message, number),
+		}
+	return results
+
+
+if __name__ == "__main__":
+
+	print("{:>8} {:>14} {:>14}".format('routes', 'linear, us', 'indexed, us'))
+	for size, result in run().items():
+		print("{:>8} {:>14.2f} {:>14.2f}".format(size, result['linear'] * 1e6, result['indexed'] * 1e6))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Measures messages per second, routed by CommonWebSocketClient from MockServer flooding 'tick' frames,
+with the long-lived reading loop, with the former per-frame task + wait() loop for comparison,
+and with the frames recorded by FrameRecorder
+"""
+
+from asyncio import *
+import logging
+import os
+import tempfile
+import time
+
+from cexio.messaging import *
+from cexio.mock_server import *
+from cexio.recorder import *
+from cexio.ws_client import *
+
+
+logging.getLogger('cexio.messaging').setLevel(logging.WARNING)
+logging.getLogger('cexio.ws_client').setLevel(logging.WARNING)
+
+
+class LegacyRoutingClient(CommonWebSocketClient):
+	"""
+	Routes with the former loop: task for each frame, waited together with stop and send error futures
+	"""
+	async def _routing(self):
+		self._send_error = Future()
+		while True:
+			self._listener_task = ensure_future(self._recv())
+
+			done, pending = await wait(
+				[self._send_error, self._listener_task],
+				return_when=FIRST_COMPLETED,
+				timeout=self._ensure_alive_timeout)
+
+			if self._listener_task in done:
+				message = self._listener_task.result()
+				await self._router(message)
+			else:
+				self._listener_task.cancel()
+				return
+
+
+async def measure(client_class, count, port, recorder=None):
+	server = MockServer(port=port, floods=(Flood('tick', count=count), ))
+	await server.start()
+	done = Future()
+	received = 0
+
+	async def on_tick(message):
+		nonlocal received
+		received += 1
+		if received == count:
+			done.set_result(time.perf_counter())
+		return message
+
+	client = client_class({'ws': {'uri': server.uri, }, 'authorize': False, })
+	client.set_router(MessageRouter((({'e': 'tick', }, on_tick), )))
+	client.set_resolver(RequestResponseFutureResolver(name='', key_set_path='oid', key_get_path='oid'))
+	client.set_recorder(recorder)
+	try:
+		start = time.perf_counter()
+		await client.run()
+		end = await wait_for(done, 60)
+		return count / (end - start)
+	finally:
+		await client.stop()
+		await server.stop()
+
+
+def run(count=50000, port=8765):
+	loop = new_event_loop()
+	set_event_loop(loop)
+	try:
+		with tempfile.TemporaryDirectory() as directory:
+			recorder = FrameRecorder(os.path.join(directory, 'bench'))
+			try:
+				return {
+					'legacy': loop.run_until_complete(measure(LegacyRoutingClient, count, port)),
+					'reader': loop.run_until_complete(measure(CommonWebSocketClient, count, port)),
+					'recorded': loop.run_until_complete(measure(CommonWebSocketClient, count, port, recorder)),
+				}
+			finally:
+				recorder.close()
+	finally:
+		loop.close()
+
+
+if __name__ == "__main__":
+
+	for name, rate in run().items():
+		print("{:>8}: {:>10.0f} messages/s".format(name, rate))
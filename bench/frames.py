@@ -0,0 +1,60 @@
+"""
+Realistic CEX.IO WebSocket frames for benchmarks, shaped after the public data samples:
+tick, md, md_groupped, history, history-update, ohlcv24 and request/response frames,
+or frames captured to file, one JSON message per line
+"""
+
+import json
+import random
+
+
+def create_messages(seed=1, depth=50, history_size=200):
+	rnd = random.Random(seed)
+
+	def price():
+		return round(4000 + rnd.random() * 100, 4)
+
+	def amount():
+		return rnd.randrange(1, 10 ** 9)
+
+	return {
+		'tick': {'e': 'tick', 'data': {'symbol1': 'BTC', 'symbol2': 'USD', 'price': str(price()), }, },
+		'md': {'e': 'md', 'data': {
+			'id': 67808, 'pair': 'BTC:USD', 'buy_total': 63221099, 'sell_total': 112430315118,
+			'buy': [[price(), amount()] for _ in range(depth)],
+			'sell': [[price(), amount()] for _ in range(depth)],
+		}, },
+		'md_groupped': {'e': 'md_groupped', 'data': {
+			'id': 67808, 'pair': 'BTC:USD',
+			'buy': {str(price()): amount() for _ in range(depth)},
+			'sell': {str(price()): amount() for _ in range(depth)},
+		}, },
+		'history': {'e': 'history', 'data': [
+			'{}:{}:{}:{}:{}'.format(rnd.choice('bs'), 1457703218519 + n, amount(), price(), 667580 + n)
+			for n in range(history_size)
+		], },
+		'history-update': {'e': 'history-update', 'data': [
+			[rnd.choice(('buy', 'sell')), '1457703218519', str(amount()), str(price()), '667581'],
+		], },
+		'ohlcv24': {'e': 'ohlcv24', 'pair': 'BTC:USD', 'data': [str(price()) for _ in range(5)], },
+		'ticker': {'e': 'ticker', 'oid': 'iuq3gdf6h_1_ticker', 'ok': 'ok', 'data': {
+			'timestamp': '1471427037', 'low': '290', 'high': '290', 'last': '290', 'volume': '0.02062068',
+			'volume30d': '14.38062068', 'bid': 240, 'ask': 290, 'pair': ['BTC', 'USD'],
+		}, },
+	}
+
+
+def create_frames(**kwargs):
+	# Returns {event: JSON str} of generated messages
+	return {event: json.dumps(message) for event, message in create_messages(**kwargs).items()}
+
+
+def load_frames(path):
+	# Returns {event: [JSON str, ...]} of frames captured to file, one per line
+	frames = {}
+	with open(path) as f:
+		for line in f:
+			line = line.strip()
+			if line:
+				frames.setdefault(json.loads(line).get('e', ''), []).append(line)
+	return frames
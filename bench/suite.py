@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+"""
+Runs the benchmark suite of messaging and client paths, and checks the results for regressions:
+message matching, MessageRouter dispatch by table size, CallChain depth, resolver mark/resolve,
+JSON decode of CEX.IO frames, and end-to-end messages per second and request RTT against MockServer.
+Each metric is the best of --runs suite runs. Results are written as JSON, compared to the stored baseline
+(of the same machine, see --save-baseline), scaled by the (best) time of the calibration workload, run before
+each group of metrics, to that of the baseline, to allow for the machine running slower or faster as a whole for a while:
+the exit code is 1 if any metric is worse than its baseline by more than the threshold
+(relative: 0.5 - 50% slower, or 1.5 times lower rate).
+Results of other iteration scale than the baseline are not compared (so --quick runs are compared only to
+a baseline saved by --quick run, to other --baseline file); results of other JSON codec can't be compared
+to the baseline: the exit code is 2 then
+Usage: python -m bench.suite [--output FILE] [--baseline FILE] [--save-baseline] [--threshold T] [--runs N] [--quick]
+"""
+
+from asyncio import *
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+from cexio.codec import *
+from cexio.messaging import *
+from cexio.mock_server import *
+from cexio.ws_client import *
+
+from bench import bench_router, bench_ws_reader
+from bench.frames import create_frames, create_messages
+
+
+logging.getLogger('cexio.messaging').setLevel(logging.ERROR)
+logging.getLogger('cexio.ws_client').setLevel(logging.ERROR)
+logging.getLogger('cexio.mock_server').setLevel(logging.ERROR)
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Allowed relative regression of micro benchmarks, and of end-to-end ones (noisier)
+THRESHOLD = 0.5
+E2E_THRESHOLD = 1.0
+
+REPEAT = 5
+
+
+def measure(func, number):
+	# Returns the best of REPEAT runs, seconds per call, with no garbage collection while running (as timeit)
+	best = None
+	gc.disable()
+	try:
+		for _ in range(REPEAT):
+			start = time.perf_counter()
+			for _ in range(number):
+				func()
+			elapsed = (time.perf_counter() - start) / number
+			best = elapsed if best is None else min(best, elapsed)
+	finally:
+		gc.enable()
+	return best
+
+
+def measure_async(coroutine_function, number):
+	# Returns the best of REPEAT runs, seconds per awaited call
+	async def run():
+		best = None
+		gc.collect()
+		for _ in range(REPEAT):
+			start = time.perf_counter()
+			for _ in range(number):
+				await coroutine_function()
+			elapsed = (time.perf_counter() - start) / number
+			best = elapsed if best is None else min(best, elapsed)
+		return best
+
+	loop = new_event_loop()
+	set_event_loop(loop)
+	try:
+		return loop.run_until_complete(run())
+	finally:
+		loop.close()
+
+
+def calibrate(number):
+	# Returns time (us) of pure Python workload, like matching a message, which the suite results are scaled by
+	message = {'e': 'tick', 'data': {'symbol1': 'BTC', 'symbol2': 'USD', 'price': '4000.1', }, }
+	t_message = {'e': 'tick', 'data': {'symbol1': None, 'symbol2': None, 'price': None, }, }
+
+	def work():
+		for key, value in t_message.items():
+			other = message.get(key)
+			if isinstance(value, dict):
+				for k, v in value.items():
+					if k not in other or v is not None and v != other[k]:
+						return False
+			elif value is not None and value != other:
+				return False
+		return True
+
+	return measure(work, number) * 1e6
+
+
+def us(seconds, threshold=THRESHOLD):
+	return {'value': seconds * 1e6, 'unit': 'us', 'better': 'lower', 'threshold': threshold, }
+
+
+def run_match(number):
+	messages = create_messages()
+	cases = {
+		'response': (messages['ticker'], {'e': None, 'data': None, 'oid': None, 'ok': None, }),
+		'md': (messages['md'], {'e': 'md', 'data': {'pair': None, }, }),
+	}
+	functions = {
+		'message_equal': message_equal,
+		'message_equal_or_greater': message_equal_or_greater,
+		'message_equal_or_less': message_equal_or_less,
+	}
+	compilers = {
+		'compiled_equal': compile_message_equal,
+		'compiled_equal_or_greater': compile_message_equal_or_greater,
+		'compiled_equal_or_less': compile_message_equal_or_less,
+	}
+
+	metrics = {}
+	for case, (message, t_message) in cases.items():
+		for name, function in functions.items():
+			metrics['match.{}.{}'.format(name, case)] = us(measure(lambda: function(message, t_message), number))
+		for name, compiler in compilers.items():
+			match = compiler(t_message)
+			metrics['match.{}.{}'.format(name, case)] = us(measure(lambda: match(message), number))
+	return metrics
+
+
+def run_router(number, sizes=(4, 16, 64, 256)):
+	metrics = {}
+	for size, result in bench_router.run(sizes, number).items():
+		metrics['router.linear.{}'.format(size)] = us(result['linear'])
+		metrics['router.indexed.{}'.format(size)] = us(result['indexed'])
+	return metrics
+
+
+def run_chain(number, depths=(1, 4, 16)):
+	async def handler(message):
+		return message
+
+	message = create_messages()['tick']
+	metrics = {}
+	for depth in depths:
+		call_chain = CallChain(handler)
+		for _ in range(depth - 1):
+			call_chain + handler
+		metrics['chain.depth.{}'.format(depth)] = us(measure_async(lambda: call_chain(message), number))
+	return metrics
+
+
+def run_resolver(number):
+	# instrumented, as the resolver of WebSocketClientSingleCallback
+	resolver = RequestResponseFutureResolver(name='', op_name_get_path='e', key_set_path='oid', key_get_path='oid',
+											 instrument=True)
+	data = {'pair': ['BTC', 'USD'], }
+
+	async def mark_and_resolve():
+		future = get_event_loop().create_future()
+		request = resolver.mark({'e': 'ticker', 'data': data, }, future)
+		await resolver({'e': 'ticker', 'oid': request['oid'], 'ok': 'ok', 'data': data, })
+
+	return {'resolver.mark_resolve': us(measure_async(mark_and_resolve, number))}
+
+
+def run_decode(number):
+	codec = get_codec()
+	metrics = {}
+	for event, frame in create_frames().items():
+		metrics['decode.{}'.format(event)] = us(measure(lambda: codec.loads(frame), number))
+	return metrics
+
+
+async def measure_rtt(count):
+	# Returns request RTTs (seconds) of sequential requests to MockServer
+	server = MockServer()
+	await server.start()
+	client = WebSocketClientSingleCallback({'ws': {'uri': server.uri, }, 'authorize': False, })
+	try:
+		await client.run()
+		rtts = []
+		for n in range(count):
+			start = time.perf_counter()
+			await client.request({'e': 'ticker', 'data': ['BTC', 'USD'], })
+			rtts.append(time.perf_counter() - start)
+		return sorted(rtts)
+	finally:
+		await client.stop()
+		await server.stop()
+
+
+def run_e2e(count):
+	loop = new_event_loop()
+	set_event_loop(loop)
+	try:
+		rate = loop.run_until_complete(bench_ws_reader.measure(CommonWebSocketClient, count, 0))
+		rtts = loop.run_until_complete(measure_rtt(max(count // 50, 100)))
+	finally:
+		loop.close()
+	return {
+		'e2e.messages_per_s': {'value': rate, 'unit': '1/s', 'better': 'higher', 'threshold': E2E_THRESHOLD, },
+		'e2e.rtt.p50': us(rtts[len(rtts) // 2], E2E_THRESHOLD),
+		'e2e.rtt.p99': us(rtts[len(rtts) * 99 // 100], E2E_THRESHOLD),
+	}
+
+
+def run(scale=1.0):
+	def n(number):
+		return max(int(number * scale), 1)
+
+	# calibrated before each group of metrics
+	metrics = {}
+	for group, number in ((run_match, 100000), (run_router, 20000), (run_chain, 20000), (run_resolver, 20000),
+						  (run_decode, 2000), (run_e2e, 50000)):
+		calibration = calibrate(n(100000))
+		for name, metric in group(n(number)).items():
+			metric['calibration'] = calibration
+			metrics[name] = metric
+	return {
+		'python': platform.python_version(),
+		'codec': get_codec().name,
+		'scale': scale,
+		'metrics': metrics,
+	}
+
+
+def normalize(metric):
+	# Returns value of the metric, as if measured with the calibration of 1 us
+	if metric['better'] == 'lower':
+		return metric['value'] / metric['calibration']
+	return metric['value'] * metric['calibration']
+
+
+def merge_best(results, other):
+	# Keeps the best value of each metric of results and other results, and the best calibration of it
+	for name, metric in other['metrics'].items():
+		best = results['metrics'].setdefault(name, dict(metric))
+		if (metric['value'] < best['value']) == (metric['better'] == 'lower'):
+			best['value'] = metric['value']
+		best['calibration'] = min(best['calibration'], metric['calibration'])
+	return results
+
+
+def compare(results, baseline, threshold=None):
+	"""
+	Returns [(name, value, baseline value, change)] of metrics worse than baseline by more than threshold
+	(of the metric, if None); change is relative, of calibrated values (see normalize()):
+	value / baseline - 1 for times, baseline / value - 1 for rates
+	"""
+	regressions = []
+	for name, metric in sorted(results['metrics'].items()):
+		base = baseline['metrics'].get(name)
+		if base is None or base['value'] <= 0 or metric['value'] <= 0:
+			continue
+		if metric['better'] == 'lower':
+			change = normalize(metric) / normalize(base) - 1
+		else:
+			change = normalize(base) / normalize(metric) - 1
+		if change > (metric['threshold'] if threshold is None else threshold):
+			regressions.append((name, metric['value'], base['value'], change))
+	return regressions
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Benchmark suite with regression check against the baseline")
+	parser.add_argument('--output', help="file to write results JSON to (default: stdout)")
+	parser.add_argument('--baseline', default=BASELINE, help="baseline results JSON (default: %(default)s)")
+	parser.add_argument('--save-baseline', action='store_true', help="save results as the baseline")
+	parser.add_argument('--threshold', type=float, help="allowed relative regression of all metrics")
+	parser.add_argument('--runs', type=int, default=3, help="suite runs, best of which is taken (default: %(default)s)")
+	parser.add_argument('--quick', action='store_true', help="10 times fewer iterations, for smoke runs")
+	args = parser.parse_args(argv)
+
+	scale = 0.1 if args.quick else 1.0
+	results = run(scale)
+	for _ in range(args.runs - 1):
+		merge_best(results, run(scale))
+
+	output = json.dumps(results, indent=2, sort_keys=True)
+	if args.output:
+		with open(args.output, 'w') as f:
+			f.write(output + '\n')
+	else:
+		print(output)
+
+	if args.save_baseline:
+		with open(args.baseline, 'w') as f:
+			f.write(output + '\n')
+		print("Baseline saved: {}".format(args.baseline), file=sys.stderr)
+		return 0
+
+	try:
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+	except FileNotFoundError:
+		print("No baseline: {}, not compared".format(args.baseline), file=sys.stderr)
+		return 0
+
+	if results['scale'] != baseline.get('scale', 1.0):
+		print("Not compared to baseline {} of other scale: {}".format(args.baseline, baseline.get('scale', 1.0)),
+			  file=sys.stderr)
+		return 0
+	if results['codec'] != baseline['codec']:
+		print("Can't compare to baseline {} of other codec: {} (results of {})".format(
+			args.baseline, baseline['codec'], results['codec']), file=sys.stderr)
+		return 2
+
+	regressions = compare(results, baseline, args.threshold)
+	for name, value, base, change in regressions:
+		print("REGRESSION {}: {:.2f} (baseline {:.2f}, {:+.0%} calibrated)".format(name, value, base, change),
+			  file=sys.stderr)
+	print("{} metrics, {} regressions".format(len(results['metrics']), len(regressions)), file=sys.stderr)
+	return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+
+	sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+The :mod:`cexio.codec` module provides JSON codecs for :mod:`cexio.ws_client` and :mod:`cexio.rest_client`:
+JsonCodec
+get_codec
+RequestTemplate
+"""
+
+
+import collections
+import copy
+import json
+
+from .exceptions import *
+from .messaging import create_dict_setter
+
+
+__all__ = [
+	'JsonCodec',
+	'get_codec',
+	'RequestTemplate',
+]
+
+
+# loads(str or bytes) -> object, dumps(object) -> str
+JsonCodec = collections.namedtuple('JsonCodec', ('name', 'loads', 'dumps', ))
+
+
+def _create_json():
+	def loads(s):
+		if isinstance(s, (bytes, bytearray)):
+			s = s.decode()
+		return json.loads(s)
+
+	def dumps(obj):
+		return json.dumps(obj, separators=(',', ':'))
+
+	return JsonCodec('json', loads, dumps)
+
+
+def _create_orjson():
+	import orjson
+	option = orjson.OPT_NON_STR_KEYS
+
+	def dumps(obj):
+		return orjson.dumps(obj, option=option).decode()
+
+	return JsonCodec('orjson', orjson.loads, dumps)
+
+
+def _create_rapidjson():
+	import rapidjson
+	return JsonCodec('rapidjson', rapidjson.loads, rapidjson.dumps)
+
+
+def _create_ujson():
+	import ujson
+	return JsonCodec('ujson', ujson.loads, ujson.dumps)
+
+
+# Codecs in order of preference for 'auto'
+_codec_factories = collections.OrderedDict((
+	('orjson', _create_orjson),
+	('rapidjson', _create_rapidjson),
+	('ujson', _create_ujson),
+	('json', _create_json),
+))
+
+
+def get_codec(name='auto'):
+	"""
+	Returns JsonCodec by name: 'orjson', 'rapidjson', 'ujson' or 'json' (stdlib),
+	'auto' - the first one installed, in that order
+	"""
+	if name == 'auto':
+		for factory in _codec_factories.values():
+			try:
+				return factory()
+			except ImportError:
+				pass
+
+	try:
+		factory = _codec_factories[name]
+	except KeyError:
+		raise ConfigError("Unknown JSON codec: {}".format(name))
+	try:
+		return factory()
+	except ImportError as ex:
+		raise ConfigError("JSON codec '{}' is not installed".format(name), ex)
+
+
+class RequestTemplate(object):
+	"""
+	Request message, serialized once, with the values of its variable fields spliced into the serialized parts
+	on render(*values), in order of paths: key_path (like 'oid', set by resolver) if given, then fields paths
+	RequestTemplate({'e': 'ticker', 'data': ['BTC', 'USD'], }, key_path='oid').render('1_ticker_1')
+	"""
+	def __init__(self, message, *, key_path=None, fields=(), codec=None):
+		self.message = message
+		self.key_path = key_path
+		self.paths = ((key_path, ) if key_path is not None else ()) + tuple(fields)
+		self._codec = codec if codec is not None else get_codec()
+
+		# serialized with placeholders, split by them into parts
+		template = copy.deepcopy(message)
+		placeholders = {}
+		for index, path in enumerate(self.paths):
+			placeholder = '\x00{}\x00'.format(index)
+			create_dict_setter(path)(template, placeholder)
+			placeholders[self._codec.dumps(placeholder)] = index
+		serialized = self._codec.dumps(template)
+
+		self._parts = []
+		self._order = []
+		start = 0
+		for placeholder, index in sorted(placeholders.items(), key=lambda item: serialized.find(item[0])):
+			position = serialized.find(placeholder, start)
+			if position < 0 or serialized.find(placeholder, position + 1) >= 0:
+				raise ConfigError("Can't make request template of: {}".format(message))
+			self._parts.append(serialized[start:position])
+			self._order.append(index)
+			start = position + len(placeholder)
+		self._parts.append(serialized[start:])
+
+	def render(self, *values):
+		dumps = self._codec.dumps
+		parts = self._parts
+		order = self._order
+		if len(order) == 0:
+			return parts[0]
+		elif len(order) == 1:
+			return parts[0] + dumps(values[0]) + parts[1]
+		result = [parts[0]]
+		for index, part in zip(order, parts[1:]):
+			result.append(dumps(values[index]))
+			result.append(part)
+		return ''.join(result)
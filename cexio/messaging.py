@@ -1,32 +1,57 @@
 """
 The :mod:`cexio.messaging` module provides primitives to build event model in CEX.IO client software:
-CallChain (to be substitute with 'chain()' generator function)
+CallChain
+chain
+BatchHandler
 MessageRouter
+Broadcast
 RequestResponseFutureResolver
+MessagePattern
+FrameFilter
+peek_event
 message_equal_or_less
 message_equal_or_greater
 message_equal
 compare_messages
+compile_message_equal_or_less
+compile_message_equal_or_greater
+compile_message_equal
 create_dict_setter
 create_dict_getter
 """
 
 
+import asyncio
+import collections
 import inspect
+import itertools
+import json
 import logging
 import datetime
+import functools
+import time
 
 from .exceptions import *
+from .metrics import *
 
 
 __all__ = [
 	'CallChain',
+	'chain',
+	'BatchHandler',
 	'MessageRouter',
+	'Broadcast',
 	'RequestResponseFutureResolver',
+	'MessagePattern',
+	'FrameFilter',
+	'peek_event',
 	'message_equal_or_less',
 	'message_equal_or_greater',
 	'message_equal',
 	'compare_messages',
+	'compile_message_equal_or_less',
+	'compile_message_equal_or_greater',
+	'compile_message_equal',
 	'create_dict_setter',
 	'create_dict_getter',
 ]
@@ -40,10 +65,13 @@ class CallChain(object):
 	"""
 	Wraps single callable to support message handling async chain call
 	callable may be either coroutine or function
+	The chain is flattened into steps on the first call after bind() or unbind() of any chain, see get_steps()
+	If 'instrument' is set, calls, rejections and latency of each step are collected, see get_stats()
 	"""
-	# TODO: create chain() generator function which is creating chain call instead of chaining at runtime
-	#
-	def __init__(self, handler=None):
+	# incremented on each bind() or unbind(), steps cached at the other generation are flattened again
+	_generation = 0
+
+	def __init__(self, handler=None, *, instrument=False):
 		"""
 		method passed processes the message __next_callable
 		subscribers are called with its' return value if it is not None
@@ -51,6 +79,9 @@ class CallChain(object):
 		assert not isinstance(handler, CallChain), "Nesting of CallChain object is not suggested"
 		self._next = None
 		self._handler = handler
+		self._steps = None
+		self._steps_generation = None
+		self._stats = [] if instrument else None
 
 	def get_next_callable(self):
 		return self._next
@@ -58,6 +89,8 @@ class CallChain(object):
 	def bind(self, next_callable):
 		# attaches new CallChainNode(__next_callable) to the end of the chain
 		assert callable(next_callable)
+		# this chain may be the tail of other chains, so steps cached by all chains are invalidated
+		CallChain._generation += 1
 		node = self
 		while node._next is not None:
 			node = node._next
@@ -68,8 +101,30 @@ class CallChain(object):
 		return self
 
 	def unbind(self):
+		CallChain._generation += 1
 		self._next = None
 
+	def _get_cached_steps(self):
+		# Returns steps, flattened again if any chain is changed since they were
+		if self._steps_generation != CallChain._generation:
+			self._steps = self.get_steps()
+			self._steps_generation = CallChain._generation
+		return self._steps
+
+	def get_steps(self):
+		# Returns the chain as flat tuple of (handler, is_awaitable) pairs, classifying each handler once
+		# A successor, which redefines __call__ (like RequestResponseFutureResolver), calls the rest itself
+		steps = []
+		node = self
+		while node is not None:
+			if node is not self and type(node).__call__ is not CallChain.__call__:
+				steps.append((node, True))
+				break
+			if node._handler is not None:
+				steps.append((node._handler, CallChain.is_awaitable(node._handler)))
+			node = node._next
+		return tuple(steps)
+
 	def __str__(self, *args, **kwargs):
 		return "{} ({}, next: {})".format(self.__class__.__name__, self._handler, self._next)
 
@@ -101,18 +156,139 @@ class CallChain(object):
 		else:
 			return False
 
+	def get_stats(self):
+		# Returns snapshot of steps statistics, None if not instrumented
+		if self._stats is None:
+			return None
+		steps = self._get_cached_steps()
+		return {
+			'steps': [dict(handler=str(handler), **stats.get_snapshot())
+					  for (handler, is_awaitable), stats in zip(steps, self._stats)],
+		}
+
+	async def __call__(self, message):
+		steps = self._steps
+		if self._steps_generation != CallChain._generation:
+			steps = self._get_cached_steps()
+		if self._stats is not None:
+			return await self._call_instrumented(steps, message)
+		for handler, is_awaitable in steps:
+			if is_awaitable:
+				message = await handler(message)
+			else:
+				message = handler(message)
+			if message is None:
+				break
+		return message
+
+	async def _call_instrumented(self, steps, message):
+		all_stats = self._get_steps_stats(steps)
+		for (handler, is_awaitable), stats in zip(steps, all_stats):
+			start = monotonic_ns()
+			if is_awaitable:
+				message = await handler(message)
+			else:
+				message = handler(message)
+			stats.add(message, monotonic_ns() - start)
+			if message is None:
+				break
+		return message
+
+	def _get_steps_stats(self, steps):
+		all_stats = self._stats
+		while len(all_stats) < len(steps):
+			all_stats.append(HandlerStats())
+		return all_stats
+
+	async def dispatch_many(self, messages):
+		# Processes messages like __call__ one by one, but calls each step once for all messages,
+		# which are not rejected by previous steps; returns list of results in the order of messages
+		steps = self._get_cached_steps()
+		all_stats = self._get_steps_stats(steps) if self._stats is not None else (None, ) * len(steps)
+
+		results = [None] * len(messages)
+		positions = range(len(messages))
+		for (handler, is_awaitable), stats in zip(steps, all_stats):
+			if len(messages) == 0:
+				break
+			start = monotonic_ns() if stats is not None else 0
+			step_results = await _dispatch_group(handler, is_awaitable, messages)
+			if stats is not None:
+				_add_group_stats(stats, step_results, monotonic_ns() - start)
+			positions, messages = _filter_accepted(positions, step_results)
+
+		for position, message in zip(positions, messages):
+			results[position] = message
+		return results
+
+
+async def _dispatch_group(handler, is_awaitable, messages):
+	# calls batch-aware handler (having dispatch_many()) once with the list of messages, others one by one
+	dispatch_many = getattr(handler, 'dispatch_many', None)
+	if dispatch_many is not None:
+		return await dispatch_many(messages)
+	results = []
+	for message in messages:
+		if is_awaitable:
+			results.append(await handler(message))
+		else:
+			results.append(handler(message))
+	return results
+
+
+def _filter_accepted(positions, results):
+	# returns positions and results, which are not None
+	accepted = [(position, result) for position, result in zip(positions, results) if result is not None]
+	return [position for position, result in accepted], [result for position, result in accepted]
+
+
+def _add_group_stats(stats, results, latency):
+	latency //= max(len(results), 1)
+	for result in results:
+		stats.add(result, latency)
+
+
+class BatchHandler(object):
+	"""
+	Wraps coroutine function, which processes list of messages and returns list of results of the same length,
+	to be used as handler of MessageRouter or CallChain:
+	dispatch_many() of the router or chain calls it once with all the messages routed to it,
+	single message call passes the message in list of one
+	"""
+	def __init__(self, handler):
+		self._handler = handler
+
+	def __str__(self, *args, **kwargs):
+		return "{} ({})".format(self.__class__.__name__, self._handler)
+
 	async def __call__(self, message):
-		# generic call, which eventually may be regenerated to descope if-logic from runtime to construct time
-		if self._handler is not None:
-			if CallChain.is_awaitable(self._handler):
-				message = await self._handler(message)
+		results = await self._handler([message])
+		return results[0]
+
+	async def dispatch_many(self, messages):
+		return await self._handler(messages)
+
+
+def chain(*handlers):
+	"""
+	Returns coroutine function, which calls handlers one by one with the result of previous one,
+	until the result is None, like CallChain(handlers[0]) + handlers[1] + ...
+	each handler is classified as coroutine or function once, here
+	"""
+	steps = tuple((handler, CallChain.is_awaitable(handler)) for handler in handlers if handler is not None)
+
+	async def call_chain(message):
+		for handler, is_awaitable in steps:
+			if is_awaitable:
+				message = await handler(message)
 			else:
-				message = self._handler(message)
-		if message is not None and self._next is not None:
-			logger.debug("    CallChain> chain {} to {}".format(message, self._next))
-			message = await self._next.__call__(message)
+				message = handler(message)
+			if message is None:
+				break
 		return message
 
+	return call_chain
+
 
 async def default_message_router_sink(message):
 	logger.warn("    Router> Unhandled message came to default Router.sink: {}".format(message))
@@ -126,17 +302,137 @@ class MessageRouter(list):
 	- if message matched but rejected by coro returning None, matching moves to the next pattern;
 	- if message not matched, it is sent to the sink or default sink coroutine;
 	- coroutines in the list can be either - single async callback, CallChain, other Router
+	Patterns (template messages or MessagePattern objects) are compiled into match functions at construct time,
+	and again whenever the list is modified.
+	If 'index_path' is given (like 'e' or 'data/pair'), routes are indexed on the constant string values
+	their patterns have at that path, so a message is matched only against the routes
+	with the same value plus the routes which do not fix the value (wildcards), in the original order.
+	If 'instrument' is set, calls, rejections and latency of each route and sink hits are collected,
+	see get_stats()
 	"""
+	# incremented on each modification or bind() of any router, FrameFilters of the other generation are rebuilt
+	_generation = 0
+
 	def __init__(self, t_messages_entries, *,
 				 sink=default_message_router_sink,
 				 strict_match=False,
+				 index_path=None,
+				 instrument=False,
 				 **kwargs):
 		super().__init__(t_messages_entries)
 		self.__sink = sink
 		if strict_match:
-			self.__matcher = message_equal
+			self.__compile_matcher = compile_message_equal
 		else:
-			self.__matcher = message_equal_or_greater
+			self.__compile_matcher = compile_message_equal_or_greater
+		self.__instrument = instrument
+		self.__messages = 0
+		self.__sink_hits = 0
+
+		self.__index_path = tuple(index_path.split('/')) if index_path is not None else None
+		self.__entries = ()
+		self.__routes = ()
+		self.__indexed_routes = None
+		self.__wildcard_routes = None
+		self.__compile()
+
+	def __compile(self):
+		# (Re)builds routes of the list entries, keeping stats of the entries routed before
+		MessageRouter._generation += 1
+		stats = {id(entry): route[2] for entry, route in zip(self.__entries, self.__routes)}
+		routes = []
+		for route_no, entry in enumerate(self):
+			t_message, handler = entry
+			route_stats = None
+			if self.__instrument:
+				route_stats = stats.get(id(entry)) or HandlerStats()
+			routes.append((self.__compile_matcher(t_message), handler, route_stats, route_no))
+		self.__entries = tuple(self)
+		self.__routes = tuple(routes)
+		if self.__index_path is not None:
+			self.__build_index()
+
+	def __build_index(self):
+		buckets = {}
+		wildcards = []
+		for route_no, (t_message, handler) in enumerate(self):
+			value = _get_template(t_message)
+			for key in self.__index_path:
+				value = value.get(key) if isinstance(value, dict) else None
+			if isinstance(value, str):
+				buckets.setdefault(value, []).append(route_no)
+			else:
+				wildcards.append(route_no)
+
+		self.__wildcard_routes = tuple(self.__routes[route_no] for route_no in wildcards)
+		self.__indexed_routes = {
+			value: tuple(self.__routes[route_no] for route_no in sorted(route_nos + wildcards))
+			for value, route_nos in buckets.items()
+		}
+
+	# list modifications recompile routes
+
+	def __setitem__(self, *args):
+		super().__setitem__(*args)
+		self.__compile()
+
+	def __delitem__(self, *args):
+		super().__delitem__(*args)
+		self.__compile()
+
+	def __iadd__(self, other):
+		super().__iadd__(other)
+		self.__compile()
+		return self
+
+	def __imul__(self, other):
+		super().__imul__(other)
+		self.__compile()
+		return self
+
+	def append(self, entry):
+		super().append(entry)
+		self.__compile()
+
+	def extend(self, entries):
+		super().extend(entries)
+		self.__compile()
+
+	def insert(self, index, entry):
+		super().insert(index, entry)
+		self.__compile()
+
+	def remove(self, entry):
+		super().remove(entry)
+		self.__compile()
+
+	def pop(self, *args):
+		entry = super().pop(*args)
+		self.__compile()
+		return entry
+
+	def clear(self):
+		super().clear()
+		self.__compile()
+
+	def sort(self, *args, **kwargs):
+		super().sort(*args, **kwargs)
+		self.__compile()
+
+	def reverse(self):
+		super().reverse()
+		self.__compile()
+
+	def __get_routes(self, message):
+		# candidate routes for the message, in the original order
+		value = message
+		for key in self.__index_path:
+			if not isinstance(value, dict):
+				return self.__wildcard_routes
+			value = value.get(key)
+		if isinstance(value, str):
+			return self.__indexed_routes.get(value, self.__wildcard_routes)
+		return self.__wildcard_routes
 
 	def __str__(self, *args, **kwargs):
 		return "{} ({}) Sink: {}".format(self.__class__.__name__, super().__str__(), self.__sink)
@@ -146,47 +442,229 @@ class MessageRouter(list):
 
 	def bind(self, other):
 		assert callable(other)
+		MessageRouter._generation += 1
 		self.__sink = other
 		return self
 
+	def get_sink(self):
+		return self.__sink
+
 	def __add__(self, *args, **kwargs):
 		self.bind(args[0])
 		return self
 
+	def get_stats(self):
+		# Returns snapshot of routes statistics, None if not instrumented
+		if not self.__instrument:
+			return None
+		return {
+			'messages': self.__messages,
+			'sink': self.__sink_hits,
+			'routes': [dict(pattern=t_message, **stats.get_snapshot())
+					   for (t_message, handler), (match, h, stats, route_no) in zip(self, self.__routes)],
+		}
+
 	async def __call__(self, message):
-		for t_message, handler in self:
-			if self.__matcher(message, t_message):
-				logger.debug("    Router> route {} to {}".format(message, handler))
+		routes = self.__routes if self.__index_path is None else self.__get_routes(message)
+		if self.__instrument:
+			return await self.__call_instrumented(routes, message)
+		for match, handler, stats, route_no in routes:
+			if match(message):
+				logger.debug("    Router> route %s to %s", message, handler)
 				result = await handler(message)
 				if result is not None:  # processed by handler, ignored(passed back) otherwise
 					return result
-		logger.debug("    Router> pass {} to {}".format(message, self.__sink))
+		logger.debug("    Router> pass %s to %s", message, self.__sink)
 		return await self.__sink(message)  # send any unprocessed to sink
 
+	async def __call_instrumented(self, routes, message):
+		self.__messages += 1
+		for match, handler, stats, route_no in routes:
+			if match(message):
+				start = monotonic_ns()
+				result = await handler(message)
+				stats.add(result, monotonic_ns() - start)
+				if result is not None:
+					return result
+		self.__sink_hits += 1
+		return await self.__sink(message)
+
+	async def dispatch_many(self, messages):
+		# Routes messages like __call__ one by one, but calls each handler once per group of messages matched to it,
+		# in the order of routes; batch-aware handlers (having dispatch_many()) get the group as list,
+		# others - message by message. Messages only move down the routes, so routes are called in their order,
+		# each one when all messages which may reach it did: its group, with the messages rejected by the routes
+		# above, is in the order of messages, as with __call__.
+		# Returns list of results in the order of messages
+		results = [None] * len(messages)
+		candidates = [self.__routes if self.__index_path is None else self.__get_routes(message)
+					  for message in messages]
+		cursors = [0] * len(messages)
+		if self.__instrument:
+			self.__messages += len(messages)
+
+		groups = {}  # route_no -> positions of messages matched to it
+		to_sink = []
+
+		def route_next(position):
+			# places the message to the group of the next matched route, or to the sink
+			message = messages[position]
+			routes = candidates[position]
+			cursor = cursors[position]
+			while cursor < len(routes) and not routes[cursor][0](message):
+				cursor += 1
+			if cursor == len(routes):
+				to_sink.append(position)
+			else:
+				cursors[position] = cursor + 1
+				groups.setdefault(routes[cursor][3], []).append(position)
+
+		for position in range(len(messages)):
+			route_next(position)
+
+		while groups:
+			route_no = min(groups)
+			positions = sorted(groups.pop(route_no))
+			match, handler, stats, route_no = self.__routes[route_no]
+			start = monotonic_ns() if stats is not None else 0
+			group_results = await _dispatch_group(handler, True, [messages[p] for p in positions])
+			if stats is not None:
+				_add_group_stats(stats, group_results, monotonic_ns() - start)
+			for position, result in zip(positions, group_results):
+				if result is None:
+					route_next(position)  # rejected, routed further
+				else:
+					results[position] = result
+
+		if len(to_sink) > 0:
+			to_sink.sort()
+			if self.__instrument:
+				self.__sink_hits += len(to_sink)
+			sink_results = await _dispatch_group(self.__sink, True, [messages[p] for p in to_sink])
+			for position, result in zip(to_sink, sink_results):
+				results[position] = result
+		return results
+
+
+class Broadcast(list):
+	"""
+	Passes message to all handlers concurrently, to be used as handler of MessageRouter route
+	- entries are handlers or (handler, options) pairs, where options may have
+	  'timeout': time budget of the handler in seconds, applicable to coroutines,
+	  'critical': if True, the caller waits for the handler, otherwise it is run in background task;
+	  defaults are given by 'timeout' and 'critical' arguments;
+	- handler errors and timeouts are logged and counted, not affecting other handlers;
+	- returns list of results of critical handlers, with exceptions in place of failed ones,
+	  None if none of them returned not None (so the router continues matching),
+	  and the message itself if there are no critical handlers
+	All handlers get the same message object, so they should not modify it
+	"""
+	def __init__(self, entries, *,
+				 timeout=None,
+				 critical=False,
+				 **kwargs):
+		super().__init__(entries)
+		critical_targets = []
+		background_targets = []
+		for entry in self:
+			handler, options = entry if isinstance(entry, tuple) else (entry, {})
+			target = handler, CallChain.is_awaitable(handler), options.get('timeout', timeout)
+			if options.get('critical', critical):
+				critical_targets.append(target)
+			else:
+				background_targets.append(target)
+		self._critical = tuple(critical_targets)
+		self._background = tuple(background_targets)
+		self._tasks = set()
+		self._errors = 0
+		self._timeouts = 0
+
+	def __str__(self, *args, **kwargs):
+		return "{} ({})".format(self.__class__.__name__, super().__str__())
+
+	def get_stats(self):
+		return {
+			'errors': self._errors,
+			'timeouts': self._timeouts,
+			'background': len(self._tasks),
+		}
+
+	async def join(self):
+		# waits for background handlers, started so far
+		while self._tasks:
+			await asyncio.wait(list(self._tasks))
+
+	async def _call_handler(self, handler, is_awaitable, timeout, message):
+		try:
+			if not is_awaitable:
+				return handler(message)
+			elif timeout is None:
+				return await handler(message)
+			else:
+				return await asyncio.wait_for(handler(message), timeout)
+		except asyncio.TimeoutError as ex:
+			self._timeouts += 1
+			logger.warning("    Broadcast> %s timed out on %s", handler, message)
+			return ex
+		except Exception as ex:
+			self._errors += 1
+			logger.warning("    Broadcast> %s failed on %s: %r", handler, message, ex)
+			return ex
+
+	async def __call__(self, message):
+		for handler, is_awaitable, timeout in self._background:
+			task = asyncio.ensure_future(self._call_handler(handler, is_awaitable, timeout, message))
+			self._tasks.add(task)
+			task.add_done_callback(self._tasks.discard)
+
+		if not self._critical:
+			return message
+		elif len(self._critical) == 1:
+			results = [await self._call_handler(*self._critical[0], message)]
+		else:
+			results = await asyncio.gather(*[self._call_handler(handler, is_awaitable, timeout, message)
+											 for handler, is_awaitable, timeout in self._critical])
+
+		for result in results:
+			if result is not None and not isinstance(result, Exception):
+				return results
+		return None
+
 
 def message_equal_or_less(message, t_message):
 	# True if 'message' equal or less __next_callable 't_message'
 	# 'None' value in t_message forces to ignore the value in message
+	# 't_message' may be MessagePattern, to use precompiled match function
+	if isinstance(t_message, MessagePattern):
+		return t_message.less(message)
 	return __message_equal_or_less(message, t_message, 0, False)
 
 
 def message_equal_or_greater(message, t_message):
 	# True if 'message' equal or greater __next_callable 't_message'
 	# 'None' value in t_message forces to ignore the value in message
+	if isinstance(t_message, MessagePattern):
+		return t_message.greater(message)
 	return __message_equal_or_less(t_message, message, 0, True)
 
 
 def message_equal(message, t_message):
 	# True if 'message' equal to 't_message'
 	# 'None' value in t_message forces to ignore the value in message
+	if isinstance(t_message, MessagePattern):
+		return t_message.equal(message)
 	return message_equal_or_less(message, t_message) & message_equal_or_greater(message, t_message)
 
 
 def compare_messages(message, t_message):
 	# True -1, 0, +1
 	# 'None' value in t_message forces to ignore the value in message
-	el = message_equal_or_less(message, t_message)
-	eg = message_equal_or_greater(message, t_message)
+	if isinstance(t_message, MessagePattern):
+		el = t_message.less(message)
+		eg = t_message.greater(message)
+	else:
+		el = message_equal_or_less(message, t_message)
+		eg = message_equal_or_greater(message, t_message)
 	if el and eg:
 		return 0
 	elif el:
@@ -225,10 +703,297 @@ def __message_equal_or_less(message, t_message, recno, reverse):
 		return False
 
 
+# The same depth the interpreting __message_equal_or_less() raises at
+_MATCH_RECURSION_LIMIT = 12
+
+
+class _MatcherBuilder(object):
+	"""
+	Generates the source of flat match function for the template message, so the matching of
+	the message is one pass of inline checks, without recursion, key views and depth counting
+	"""
+	_missing = object()
+
+	def __init__(self):
+		self._lines = ['def match(m0):']
+		self._consts = {'_missing': self._missing}
+		self._vars = 0
+
+	def const(self, value):
+		name = '_c{}'.format(len(self._consts))
+		self._consts[name] = value
+		return name
+
+	def var(self):
+		self._vars += 1
+		return 'm{}'.format(self._vars)
+
+	def line(self, indent, code):
+		self._lines.append('\t' * indent + code)
+
+	def emit_str(self, t_message, var, indent):
+		# the most of compared values are not equal, so check the equality first
+		self.line(indent, 'if {0} != {1} or not isinstance({0}, str): return False'.format(var, self.const(t_message)))
+
+	def emit_greater(self, t_message, var, indent):
+		# 'message' equal or greater 't_message': all keys of 't_message' are in message
+		if t_message is None:
+			return
+		elif isinstance(t_message, str):
+			self.emit_str(t_message, var, indent)
+		elif isinstance(t_message, dict):
+			self.line(indent, 'if not isinstance({}, dict): return False'.format(var))
+			for k, value in t_message.items():
+				key = self.const(k)
+				if value is None:
+					self.line(indent, 'if {} not in {}: return False'.format(key, var))
+				else:
+					item = self.var()
+					self.line(indent, '{} = {}.get({}, _missing)'.format(item, var, key))
+					self.emit_greater(value, item, indent)
+		else:
+			self.line(indent, 'return False')
+
+	def emit_less(self, t_message, var, indent):
+		# 'message' equal or less 't_message': all keys of message are in 't_message'
+		if t_message is None:
+			return
+		elif isinstance(t_message, str):
+			self.emit_str(t_message, var, indent)
+		elif isinstance(t_message, dict):
+			self.line(indent, 'if not isinstance({}, dict): return False'.format(var))
+			self.line(indent, 'if not {}.keys() <= {}: return False'.format(var, self.const(frozenset(t_message))))
+			for k, value in t_message.items():
+				if value is None:
+					continue
+				item = self.var()
+				self.line(indent, '{} = {}.get({}, _missing)'.format(item, var, self.const(k)))
+				self.line(indent, 'if {} is not _missing:'.format(item))
+				self.emit_less(value, item, indent + 1)
+				self.line(indent + 1, 'pass')
+		else:
+			self.line(indent, 'return False')
+
+	def emit_equal(self, t_message, var, indent):
+		if t_message is None:
+			return
+		elif isinstance(t_message, str):
+			self.emit_str(t_message, var, indent)
+		elif isinstance(t_message, dict):
+			self.line(indent, 'if not isinstance({}, dict): return False'.format(var))
+			self.line(indent, 'if {}.keys() != {}: return False'.format(var, self.const(frozenset(t_message))))
+			for k, value in t_message.items():
+				if value is None:
+					continue
+				item = self.var()
+				self.line(indent, '{} = {}[{}]'.format(item, var, self.const(k)))
+				self.emit_equal(value, item, indent)
+		else:
+			self.line(indent, 'return False')
+
+	def build(self):
+		self.line(1, 'return True')
+		namespace = dict(self._consts)
+		exec('\n'.join(self._lines), namespace)
+		return namespace['match']
+
+
+def _get_template(t_message):
+	# Returns template message of MessagePattern, or template message itself
+	return t_message.t_message if isinstance(t_message, MessagePattern) else t_message
+
+
+def _get_template_depth(t_message, limit=_MATCH_RECURSION_LIMIT):
+	# depth of the deepest node of template, counted up to the limit (template may have cycles)
+	if not isinstance(t_message, dict) or len(t_message) == 0 or limit == 0:
+		return 0
+	return 1 + max(_get_template_depth(value, limit - 1) for value in t_message.values())
+
+
+def compile_message_equal_or_less(t_message):
+	# Returns match(message) function, equal to message_equal_or_less(message, t_message)
+	if isinstance(t_message, MessagePattern):
+		return t_message.less
+	if _get_template_depth(t_message) >= _MATCH_RECURSION_LIMIT:
+		return lambda message: message_equal_or_less(message, t_message)
+	builder = _MatcherBuilder()
+	builder.emit_less(t_message, 'm0', 1)
+	return builder.build()
+
+
+def compile_message_equal_or_greater(t_message):
+	# Returns match(message) function, equal to message_equal_or_greater(message, t_message)
+	if isinstance(t_message, MessagePattern):
+		return t_message.greater
+	if _get_template_depth(t_message) >= _MATCH_RECURSION_LIMIT:
+		return lambda message: message_equal_or_greater(message, t_message)
+	builder = _MatcherBuilder()
+	builder.emit_greater(t_message, 'm0', 1)
+	return builder.build()
+
+
+def compile_message_equal(t_message):
+	# Returns match(message) function, equal to message_equal(message, t_message)
+	if isinstance(t_message, MessagePattern):
+		return t_message.equal
+	if _get_template_depth(t_message) >= _MATCH_RECURSION_LIMIT:
+		return lambda message: message_equal(message, t_message)
+	builder = _MatcherBuilder()
+	builder.emit_equal(t_message, 'm0', 1)
+	return builder.build()
+
+
+class MessagePattern(object):
+	"""
+	Template message, compiled into match functions once, to be matched many times
+	may be passed as 't_message' to message_equal_or_less, message_equal_or_greater, message_equal
+	and compare_messages
+	"""
+	__slots__ = ('t_message', 'less', 'greater', 'equal', )
+
+	def __init__(self, t_message):
+		self.t_message = t_message
+		self.less = compile_message_equal_or_less(t_message)
+		self.greater = compile_message_equal_or_greater(t_message)
+		self.equal = compile_message_equal(t_message)
+
+	def __str__(self, *args, **kwargs):
+		return "{} ({})".format(self.__class__.__name__, self.t_message)
+
+
+def peek_event(frame):
+	# Returns 'e' value of JSON frame str, which starts with it, like '{"e":"md",...', without decoding the frame,
+	# None if the frame does not start with plain string 'e' value
+	if frame.__class__ is not str:
+		return None
+	elif frame.startswith('{"e":"'):
+		start = 6
+	elif frame.startswith('{"e": "'):
+		start = 7
+	else:
+		return None
+	end = frame.find('"', start)
+	if end < 0:
+		return None
+	event = frame[start:end]
+	if '\\' in event:
+		return None
+	return event
+
+
+class FrameFilter(object):
+	"""
+	Tells, without decoding JSON frame, if the message in it may be matched by any route of the routers,
+	including routes of the routers, which are sinks of them:
+	the frame 'e' value is peeked (see peek_event()) and the routes with that or any 'e' value are checked
+	for the keys they require to be in message, to be found in the frame as "key" strings;
+	frames, which can't be peeked, are always wanted, and so are all frames if the last sink is not the default one;
+	the filter is rebuilt on the next frame, when any router is modified or bound to other sink
+	"""
+	def __init__(self, routers):
+		self._routers = tuple(routers)
+		self._generation = None
+		self._build()
+
+	def _build(self):
+		self._generation = MessageRouter._generation
+		self._routes = {}
+		self._wildcards = []
+		self._wants_all = False
+		for router in self._routers:
+			while isinstance(router, MessageRouter):
+				for t_message, handler in router:
+					self._add_route(t_message)
+				router = router.get_sink()
+			if router is not default_message_router_sink:
+				self._wants_all = True
+		self._routes = {event: tuple(routes + self._wildcards) for event, routes in self._routes.items()}
+		self._wildcards = tuple(self._wildcards)
+
+	def _add_route(self, t_message):
+		t_message = _get_template(t_message)
+		if not isinstance(t_message, dict) or not all(isinstance(key, str) for key in t_message):
+			self._wants_all = True
+			return
+		required = tuple(json.dumps(key) for key in t_message if key != 'e')
+		event = t_message.get('e')
+		if isinstance(event, str):
+			self._routes.setdefault(event, []).append(required)
+		elif len(required) == 0:
+			self._wants_all = True
+		else:
+			self._wildcards.append(required)
+
+	def wants(self, frame):
+		if self._generation != MessageRouter._generation:
+			self._build()
+		if self._wants_all:
+			return True
+		event = peek_event(frame)
+		if event is None:
+			return True
+		for required in self._routes.get(event, self._wildcards):
+			for key in required:
+				if key not in frame:
+					break
+			else:
+				return True
+		return False
+
+
+def _to_base36(number):
+	digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+	result = ''
+	while True:
+		number, digit = divmod(number, 36)
+		result = digits[digit] + result
+		if number == 0:
+			return result
+
+
+def _get_itself(d):
+	return d
+
+
+@functools.lru_cache(maxsize=None)
 def create_dict_getter(path):
-	if path is not None:
-		path = path.split('/')
+	# Returns getter(d) of the value by path like 'a/b/c', raising InvalidMessage if there is no such value
+	# getters are created once per path, with no loop for up to 3 levels
+	if path is None:
+		return _get_itself
+
+	path = path.split('/')
+	if len(path) == 1:
+		key, = path
+
+		def getter(d):
+			try:
+				return d[key]
+			except KeyError as ex:
+				raise InvalidMessage("Invalid dict getter, can't get from: {}".format(d), ex)
+
+	elif len(path) == 2:
+		key1, key2 = path
 
+		def getter(d):
+			try:
+				d = d[key1]
+				return d[key2]
+			except KeyError as ex:
+				raise InvalidMessage("Invalid dict getter, can't get from: {}".format(d), ex)
+
+	elif len(path) == 3:
+		key1, key2, key3 = path
+
+		def getter(d):
+			try:
+				d = d[key1]
+				d = d[key2]
+				return d[key3]
+			except KeyError as ex:
+				raise InvalidMessage("Invalid dict getter, can't get from: {}".format(d), ex)
+
+	else:
 		def getter(d):
 			try:
 				for item in path:
@@ -236,49 +1001,98 @@ def create_dict_getter(path):
 				return d
 			except KeyError as ex:
 				raise InvalidMessage("Invalid dict getter, can't get from: {}".format(d), ex)
-	else:
-		def getter(d):
-			return d
+
 	return getter
 
 
+@functools.lru_cache(maxsize=None)
 def create_dict_setter(path):
-	assert path is not None and path is not ''
+	# Returns setter(d, value) of the value by path like 'a/b/c', raising InvalidMessage if there is no such dict
+	# setters are created once per path, with no loop for up to 3 levels
+	assert path is not None and path != ''
 	path = path.split('/')
+	if len(path) == 1:
+		key, = path
 
-	def setter(d, value):
-		try:
-			for item in path[:-1]:
-				d = d[item]
-			d[path[-1]] = value
+		def setter(d, value):
+			d[key] = value
 			return d
 
-		except KeyError as ex:
-			raise InvalidMessage("Invalid dict setter, can't get from: {}".format(d), ex)
+	elif len(path) == 2:
+		key1, key2 = path
+
+		def setter(d, value):
+			try:
+				d = d[key1]
+				d[key2] = value
+				return d
+			except KeyError as ex:
+				raise InvalidMessage("Invalid dict setter, can't get from: {}".format(d), ex)
+
+	elif len(path) == 3:
+		key1, key2, key3 = path
+
+		def setter(d, value):
+			try:
+				d = d[key1]
+				d = d[key2]
+				d[key3] = value
+				return d
+			except KeyError as ex:
+				raise InvalidMessage("Invalid dict setter, can't get from: {}".format(d), ex)
+
+	else:
+		def setter(d, value):
+			try:
+				for item in path[:-1]:
+					d = d[item]
+				d[path[-1]] = value
+				return d
+
+			except KeyError as ex:
+				raise InvalidMessage("Invalid dict setter, can't get from: {}".format(d), ex)
 
 	return setter
 
 
+async def default_late_response_sink(message):
+	logger.info("    Resolver> Late response to expired request: %s", message)
+	return message
+
+
 class RequestResponseFutureResolver(dict, CallChain):
 	"""
-
+	Keeps futures of pending requests by request id, and resolves them with responses
+	If 'timeout' is set, the requests pending longer are evicted, and their futures are failed with
+	asyncio.TimeoutError; late responses to the recently evicted requests are passed to 'late_sink'
+	instead of being returned unresolved to the caller (MessageRouter)
+	If 'instrument' is set, requests are timed by operation name (see RequestStats), the time request
+	is written is set by caller with set_sent()
 	"""
 	# Extends CallChain, because needs to manage future here, after successor called
 
+	_instances = itertools.count()
+
 	def __init__(self, *,
 				 name=None,
 				 op_name_get_path=None,
 				 key_set_path=None,
 				 key_get_path=None,
+				 timeout=None,
+				 late_sink=default_late_response_sink,
+				 late_ids_limit=1024,
+				 instrument=False,
 				 **kwargs):
 		super(CallChain, self).__init__()
 		super(dict, self).__init__()
 
-		# generate number, unique within ~24 hours
-		# which is used as a key for request/rely pair messages
-		self._seqId_base = str(int(datetime.datetime.now().timestamp() * 1000))
+		# Request id is the prefix, unique for the resolver within ~24 hours (over reconnects and restarts),
+		# followed by the sequence number, which is the key of the pending request in the dict
+		self._seqId_base = _to_base36(int(datetime.datetime.now().timestamp() * 1000))
 		self._seqId_curr_id = 0
 		self._name = name
+		self._seqId_prefix = '{}{}_{}_'.format(self._seqId_base, _to_base36(next(self._instances)), name)
+		self._seqId_prefix_len = len(self._seqId_prefix)
 		self._key_setter = create_dict_setter(key_set_path)
 		self._key_getter = create_dict_getter(key_get_path)
 		# TODO should it be feature of resolver? think no
@@ -286,48 +1100,147 @@ class RequestResponseFutureResolver(dict, CallChain):
 		if op_name_get_path is not None:
 			self._op_name_getter = create_dict_getter(op_name_get_path)
 
+		# Timeout is the same for all requests, so deadlines come in order of marking,
+		# and expired ones are always at the head of the queue
+		self._timeout = timeout
+		self._deadlines = collections.deque()
+		self._late_sink = late_sink
+		self._late_ids = collections.OrderedDict()
+		self._late_ids_limit = late_ids_limit
+		self._expired_count = 0
+		self._late_count = 0
+		self._op_stats = {} if instrument else None  # op_name -> RequestStats
+
 	def get_next_seq_id(self):
 		self._seqId_curr_id += 1
 		return self.get_seq_id()
 
 	def get_seq_id(self):
-		return self._seqId_base + '_' + str(self._seqId_curr_id) + '_' + self._name
+		return self._seqId_prefix + str(self._seqId_curr_id)
 
-	def mark(self, request, future):
+	def get_request_key(self, request_id):
+		# Returns the sequence number of request id, made by this resolver, None otherwise
+		if request_id.__class__ is str and request_id.startswith(self._seqId_prefix):
+			try:
+				return int(request_id[self._seqId_prefix_len:])
+			except ValueError:
+				pass
+		return None
+
+	def is_response(self, message):
+		# Returns True if message has request id made by this resolver, as responses to its requests do
 		try:
-			op_name = self._op_name_getter(request)
-		except KeyError as ex:
-			raise InvalidMessage("Can't get 'op_name' from Request: {}".format(request), ex)
+			return self.get_request_key(self._key_getter(message)) is not None
+		except (KeyError, TypeError, InvalidMessage):
+			return False
 
-		request_id = self.get_next_seq_id() + op_name
-		self[request_id] = request, future
+	def mark(self, request, future):
+		request_id = self.reserve(request, future)
 		try:
 			self._key_setter(request, request_id)
 		except KeyError as ex:
 			raise InvalidMessage("Can't set 'key' to Request: {}".format(request), ex)
 		return request
 
+	def reserve(self, request, future):
+		# Returns request id, the future of request is pending by, with no id set to request,
+		# like for the request serialized by template (see cexio.codec.RequestTemplate)
+		try:
+			op_name = self._op_name_getter(request)
+		except KeyError as ex:
+			raise InvalidMessage("Can't get 'op_name' from Request: {}".format(request), ex)
+
+		request_id = self.get_next_seq_id()
+		request_key = self._seqId_curr_id
+		# times: [marked, written] ns
+		self[request_key] = request, future, op_name, [monotonic_ns(), None] if self._op_stats is not None else None
+
+		if self._timeout is not None:
+			now = time.monotonic()
+			self.evict_expired(now)
+			self._deadlines.append((now + self._timeout, request_key))
+		return request_id
+
+	def set_sent(self, request_id, sent):
+		# Sets the time (ns) the request is written, to time it (see RequestStats)
+		entry = self.get(self.get_request_key(request_id))
+		if entry is not None and entry[3] is not None:
+			entry[3][1] = sent
+
+	def add_timeout(self, request_id):
+		# Counts timeout of the request, the caller stopped waiting for
+		entry = self.get(self.get_request_key(request_id))
+		if entry is not None and entry[3] is not None:
+			self._get_op_stats(entry[2]).timeouts += 1
+
+	def _get_op_stats(self, op_name):
+		stats = self._op_stats.get(op_name)
+		if stats is None:
+			stats = self._op_stats[op_name] = RequestStats()
+		return stats
+
+	def evict_expired(self, now=None):
+		# Evicts requests pending longer than timeout, failing their futures with asyncio.TimeoutError
+		# O(1) amortized: each deadline is appended and popped once
+		if now is None:
+			now = time.monotonic()
+		deadlines = self._deadlines
+		while deadlines and deadlines[0][0] <= now:
+			deadline, request_key = deadlines.popleft()
+			entry = self.pop(request_key, None)
+			if entry is None:
+				continue  # resolved already
+			request, future, op_name, times = entry
+			if not future.done():
+				future.set_exception(asyncio.TimeoutError("Request '{}' #{} expired".format(op_name, request_key)))
+				if times is not None:
+					self._get_op_stats(op_name).timeouts += 1
+			self._expired_count += 1
+			self._late_ids[request_key] = None
+			if len(self._late_ids) > self._late_ids_limit:
+				self._late_ids.popitem(last=False)
+
+	def get_stats(self):
+		return {
+			'live': len(self),
+			'expired': self._expired_count,
+			'late': self._late_count,
+			'ops': {op_name: stats.get_snapshot() for op_name, stats in self._op_stats.items()}
+			if self._op_stats is not None else None,
+		}
+
 	def clear(self):
-		for r, f in self.values():
+		for r, f, op_name, times in self.values():
 			f.cancel()
+		self._deadlines.clear()
 		super().clear()
 
 	async def __call__(self, message):
 		# may raise Exception from successors if resolved,
 		# return result if resolved, None if not, including the case of error while getting id
 		try:
-			request_id = self._key_getter(message)
+			request_key = self.get_request_key(self._key_getter(message))
 		except KeyError as ex:
 			logger.warn("Can't get 'key' from Response: {}".format(message), ex)
 			# no key for resolving - supposed to be processed further by caller (MessageRouter)
 			return None
 
-		if request_id in self.keys():
+		if self._deadlines:
+			self.evict_expired()
+
+		entry = self.pop(request_key, None)
+		if entry is not None:
 			# 'resolved' with result or error, raised  by chan calls
-			logger.debug("    Resolver> resolve {}".format(message))
-			request, future = self.pop(request_id)
+			logger.debug("    Resolver> resolve %s", message)
+			request, future, op_name, times = entry
+			if future.done():
+				# cancelled by caller, who is not waiting any more
+				if times is not None:
+					self._get_op_stats(op_name).late += 1
+				return await self._on_late_response(message)
+			received = monotonic_ns() if times is not None else None
 			if self.get_next_callable() is not None:
-				logger.debug("    Resolver> chain {} to {}".format(message, self.get_next_callable()))
+				logger.debug("    Resolver> chain %s to %s", message, self.get_next_callable())
 				try:
 					# In Case of known exceptions,
 					# need to return not None, since response is resolved
@@ -335,13 +1248,36 @@ class RequestResponseFutureResolver(dict, CallChain):
 					message = await self.get_next_callable().__call__(message)
 				except ErrorMessage as ex:
 					future.set_exception(ex)
+					self._add_op_stats(op_name, times, received, True)
 					return ex
 				except InvalidMessage as ex:
 					future.set_exception(ex)
+					self._add_op_stats(op_name, times, received, True)
 					return ex
 			future.set_result(message)
+			self._add_op_stats(op_name, times, received, False)
 			return message
 
+		elif request_key in self._late_ids:
+			del self._late_ids[request_key]
+			return await self._on_late_response(message)
+
+	async def dispatch_many(self, messages):
+		# Resolves each response with its own future
+		results = []
+		for message in messages:
+			results.append(await self(message))
+		return results
+
+	def _add_op_stats(self, op_name, times, received, error):
+		if times is not None:
+			marked, sent = times
+			self._get_op_stats(op_name).add(marked, sent, received, monotonic_ns(), error)
+
+	async def _on_late_response(self, message):
+		self._late_count += 1
+		return await self._late_sink(message)
+
 
 if __name__ == "__main__":
 	pass
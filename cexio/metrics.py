@@ -0,0 +1,143 @@
+"""
+The :mod:`cexio.metrics` module provides low overhead primitives to instrument message processing:
+monotonic_ns
+Histogram
+HandlerStats
+RequestStats
+"""
+
+
+import bisect
+import time
+
+
+__all__ = [
+	'monotonic_ns',
+	'Histogram',
+	'HandlerStats',
+	'RequestStats',
+]
+
+
+# Monotonic clock in nanoseconds, time.perf_counter_ns() is available since Python 3.7
+if hasattr(time, 'perf_counter_ns'):
+	monotonic_ns = time.perf_counter_ns
+else:
+	def monotonic_ns():
+		return int(time.perf_counter() * 1000000000)
+
+
+# Upper bounds of buckets in ns, 1-2-5 series from 1 us to 10 s
+DEFAULT_BOUNDS_NS = tuple(m * 10 ** e for e in range(3, 10) for m in (1, 2, 5)) + (10 ** 10, )
+
+
+class Histogram(object):
+	"""
+	Fixed-bucket histogram of nanosecond values
+	value goes to the first bucket with upper bound greater or equal to it, or to the overflow bucket
+	"""
+	__slots__ = ('_bounds', '_counts', 'count', 'total', 'max', )
+
+	def __init__(self, bounds=DEFAULT_BOUNDS_NS):
+		self._bounds = tuple(bounds)
+		self._counts = [0] * (len(self._bounds) + 1)
+		self.count = 0
+		self.total = 0
+		self.max = 0
+
+	def add(self, value):
+		self._counts[bisect.bisect_left(self._bounds, value)] += 1
+		self.count += 1
+		self.total += value
+		if value > self.max:
+			self.max = value
+
+	def get_percentile(self, percent):
+		# Returns upper bound of the bucket, containing given percentile, max value for the overflow bucket
+		if self.count == 0:
+			return 0
+		rank = self.count * percent / 100
+		seen = 0
+		for bound, count in zip(self._bounds, self._counts):
+			seen += count
+			if seen >= rank:
+				return min(bound, self.max)
+		return self.max
+
+	def get_snapshot(self):
+		return {
+			'bounds': list(self._bounds),
+			'counts': list(self._counts),
+			'count': self.count,
+			'sum': self.total,
+			'max': self.max,
+			'p50': self.get_percentile(50),
+			'p99': self.get_percentile(99),
+		}
+
+
+class HandlerStats(object):
+	"""
+	Calls, rejections (handler returned None) and latency of a message handler
+	"""
+	__slots__ = ('calls', 'rejected', 'latency', )
+
+	def __init__(self):
+		self.calls = 0
+		self.rejected = 0
+		self.latency = Histogram()
+
+	def add(self, result, latency):
+		self.calls += 1
+		if result is None:
+			self.rejected += 1
+		self.latency.add(latency)
+
+	def get_snapshot(self):
+		return {
+			'calls': self.calls,
+			'rejected': self.rejected,
+			'latency': self.latency.get_snapshot(),
+		}
+
+
+class RequestStats(object):
+	"""
+	Requests of an operation: counts of requests resolved, errors, timeouts and late responses,
+	and time (ns) of request: queue - from marked to written, wire - from written to response resolving,
+	handler - resolving (resolver successors, like validator), total - from marked to resolved
+	"""
+	__slots__ = ('requests', 'errors', 'timeouts', 'late', 'queue', 'wire', 'handler', 'total', )
+
+	def __init__(self):
+		self.requests = 0
+		self.errors = 0
+		self.timeouts = 0
+		self.late = 0
+		self.queue = Histogram()
+		self.wire = Histogram()
+		self.handler = Histogram()
+		self.total = Histogram()
+
+	def add(self, marked, sent, received, done, error=False):
+		# sent is None if the time request is written is unknown
+		self.requests += 1
+		if error:
+			self.errors += 1
+		if sent is not None:
+			self.queue.add(sent - marked)
+			self.wire.add(received - sent)
+		self.handler.add(done - received)
+		self.total.add(done - marked)
+
+	def get_snapshot(self):
+		return {
+			'requests': self.requests,
+			'errors': self.errors,
+			'timeouts': self.timeouts,
+			'late': self.late,
+			'queue': self.queue.get_snapshot(),
+			'wire': self.wire.get_snapshot(),
+			'handler': self.handler.get_snapshot(),
+			'total': self.total.get_snapshot(),
+		}
@@ -0,0 +1,317 @@
+"""
+The :mod:`cexio.mock_server` module provides local stand-in of CEX.IO WebSocket server, for tests and benchmarks:
+MockServer
+Flood
+create_flood_message
+echo_response
+"""
+
+
+from asyncio import *
+import collections
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+
+import websockets
+
+from .exceptions import *
+
+
+__all__ = [
+	'MockServer',
+	'Flood',
+	'create_flood_message',
+	'echo_response',
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+# Flood of event frames sent on each connection:
+# event - 'tick', 'md', 'md_groupped', 'history', 'history-update' or 'ohlcv24';
+# rate - frames per second, None - as fast as the connection takes them; count - None for endless flood;
+# size - entries per frame, of md depth, history or history-update, default of create_flood_message() if None
+Flood = collections.namedtuple('Flood', ('event', 'rate', 'count', 'size', ))
+Flood.__new__.__defaults__ = (None, None, None, )
+
+
+def create_flood_message(event, n=0, size=None, rnd=None):
+	"""
+	Returns n-th message of the event flood (see Flood), shaped after the public data samples
+	"""
+	rnd = rnd if rnd is not None else random.Random(n)
+
+	def price():
+		return round(4000 + rnd.random() * 100, 4)
+
+	def amount():
+		return rnd.randrange(1, 10 ** 9)
+
+	if event == 'tick':
+		return {'e': 'tick', 'data': {'symbol1': 'BTC', 'symbol2': 'USD', 'price': str(price()), }, }
+	elif event == 'md':
+		size = 50 if size is None else size
+		return {'e': 'md', 'data': {
+			'id': n, 'pair': 'BTC:USD', 'buy_total': 63221099, 'sell_total': 112430315118,
+			'buy': [[price(), amount()] for _ in range(size)],
+			'sell': [[price(), amount()] for _ in range(size)],
+		}, }
+	elif event == 'md_groupped':
+		size = 50 if size is None else size
+		return {'e': 'md_groupped', 'data': {
+			'id': n, 'pair': 'BTC:USD',
+			'buy': {str(price()): amount() for _ in range(size)},
+			'sell': {str(price()): amount() for _ in range(size)},
+		}, }
+	elif event == 'history':
+		size = 200 if size is None else size
+		return {'e': 'history', 'data': [
+			'{}:{}:{}:{}:{}'.format(rnd.choice('bs'), 1457703218519 + i, amount(), price(), n * size + i)
+			for i in range(size)
+		], }
+	elif event == 'history-update':
+		size = 1 if size is None else size
+		return {'e': 'history-update', 'data': [
+			[rnd.choice(('buy', 'sell')), str(1457703218519 + i), str(amount()), str(price()), str(n * size + i)]
+			for i in range(size)
+		], }
+	elif event == 'ohlcv24':
+		return {'e': 'ohlcv24', 'pair': 'BTC:USD', 'data': [str(price()) for _ in range(5)], }
+	raise ConfigError("Unknown flood event: {}".format(event))
+
+
+def echo_response(message):
+	# Default responder of MockServer: successful response with data of the request
+	return {'e': message['e'], 'oid': message['oid'], 'ok': 'ok', 'data': message.get('data', {}), }
+
+
+class MockServer(object):
+	"""
+	Local WebSocket server, speaking the protocol CommonWebSocketClient expects:
+	sends {'e': 'connected'} on connect, checks 'auth' request signature by credentials {key: secret}
+	(if None, any 'auth' is accepted, and requests are served with no auth), responds to each request with 'oid'
+	by responder(request) (echo_response() by default, no response if it returns None),
+	sends {'e': 'ping'} every ping_interval (if set) and {'e': 'disconnecting'} if no pong before the next one,
+	and floods each connection with frames of floods (see Flood).
+	Faults are injected by:
+	drop_rate - probability of frame sent (except 'connected') to be dropped;
+	delay, delay_jitter - seconds responses are delayed by (delay + random() * delay_jitter);
+	disconnect_after - number of frames sent on connection, after which it is dropped with no close handshake
+	"""
+	def __init__(self, *, host='127.0.0.1', port=0, credentials=None, auth_window=20, responder=echo_response,
+				 floods=(), ping_interval=None, drop_rate=0.0, delay=0.0, delay_jitter=0.0, disconnect_after=None,
+				 seed=None):
+		self.host = host
+		self.port = port
+		self._credentials = credentials
+		self._auth_window = auth_window
+		self._responder = responder
+		self._floods = tuple(floods)
+		self._ping_interval = ping_interval
+		self._drop_rate = drop_rate
+		self._delay = delay
+		self._delay_jitter = delay_jitter
+		self._disconnect_after = disconnect_after
+		self._random = random.Random(seed)
+
+		# flood frames are rendered in advance, cycled while flooding
+		self._flood_frames = [
+			[json.dumps(create_flood_message(flood.event, n, flood.size, self._random)) for n in range(16)]
+			for flood in self._floods
+		]
+
+		self._server = None
+		self._connections = {}  # ws -> connection state
+
+		self._connected = 0
+		self._requests = 0
+		self._responses = 0
+		self._frames = 0
+		self._dropped = 0
+		self._pings = 0
+		self._pongs = 0
+		self._auths = 0
+		self._auth_errors = 0
+
+	@property
+	def uri(self):
+		return 'ws://{}:{}/'.format(self.host, self.port)
+
+	def get_stats(self):
+		return {
+			'connections': len(self._connections),
+			'connected': self._connected,
+			'requests': self._requests,
+			'responses': self._responses,
+			'frames': self._frames,
+			'dropped': self._dropped,
+			'pings': self._pings,
+			'pongs': self._pongs,
+			'auths': self._auths,
+			'auth_errors': self._auth_errors,
+		}
+
+	async def start(self):
+		self._server = await websockets.serve(self._serving, self.host, self.port)
+		self.port = self._server.sockets[0].getsockname()[1]
+		logger.info("MockServer> Listening on {}".format(self.uri))
+
+	async def stop(self):
+		if self._server is not None:
+			self._server.close()
+			await self._server.wait_closed()
+			self._server = None
+
+	async def disconnect(self, reason='maintenance'):
+		# Closes all connections, as the server does on maintenance
+		await gather(*(self._disconnect(ws, reason) for ws in list(self._connections)), return_exceptions=True)
+
+	def drop_connections(self):
+		# Drops all connections, with no close handshake
+		for ws in list(self._connections):
+			ws.transport.abort()
+
+	async def _serving(self, ws, path=None):
+		connection = self._connections[ws] = _Connection()
+		self._connected += 1
+		tasks = []
+		try:
+			await ws.send(json.dumps({'e': 'connected', }))
+			tasks.extend(ensure_future(self._flooding(ws, connection, flood, frames))
+						 for flood, frames in zip(self._floods, self._flood_frames))
+			if self._ping_interval is not None:
+				tasks.append(ensure_future(self._pinging(ws, connection)))
+
+			while True:
+				frame = await ws.recv()
+				try:
+					message = json.loads(frame)
+				except ValueError:
+					logger.warning("MockServer> Invalid frame: {}".format(frame))
+					continue
+				if isinstance(message, dict):
+					await self._on_message(ws, connection, message)
+
+		except websockets.ConnectionClosed:
+			pass
+		finally:
+			for task in tasks:
+				task.cancel()
+			del self._connections[ws]
+
+	async def _on_message(self, ws, connection, message):
+		event = message.get('e')
+		if event == 'pong':
+			self._pongs += 1
+			connection.pong = True
+		elif event == 'auth':
+			error = self._check_auth(message.get('auth'))
+			self._auths += 1
+			if error is None:
+				connection.authorized = True
+				await self._send(ws, connection, {'e': 'auth', 'ok': 'ok', 'data': {'ok': 'ok', }, })
+			else:
+				self._auth_errors += 1
+				await self._send(ws, connection, {'e': 'auth', 'ok': 'error', 'data': {'error': error, }, })
+		elif event is not None and 'oid' in message:
+			self._requests += 1
+			if self._credentials is not None and not connection.authorized:
+				response = {'e': event, 'oid': message['oid'], 'ok': 'error', 'data': {'error': 'Please Login', }, }
+			else:
+				response = self._responder(message)
+			if response is None:
+				return
+			delay = self._delay + self._random.random() * self._delay_jitter
+			if delay > 0:
+				# not delaying the next requests
+				ensure_future(self._respond_later(ws, connection, response, delay))
+			else:
+				await self._respond(ws, connection, response)
+
+	def _check_auth(self, auth):
+		# Returns error of auth request, None if it is valid
+		if self._credentials is None:
+			return None
+		try:
+			key, signature, timestamp = auth['key'], auth['signature'], int(auth['timestamp'])
+		except (KeyError, TypeError, ValueError):
+			return 'Invalid auth request'
+		secret = self._credentials.get(key)
+		if secret is None:
+			return 'Invalid API key'
+		if abs(time.time() - timestamp) > self._auth_window:
+			return 'Timestamp is not in {}sec range'.format(self._auth_window)
+		expected = hmac.new(secret.encode(), '{}{}'.format(timestamp, key).encode(), hashlib.sha256).hexdigest()
+		if not isinstance(signature, str) or not hmac.compare_digest(expected, signature):
+			return 'Invalid signature'
+		return None
+
+	async def _respond(self, ws, connection, response):
+		await self._send(ws, connection, response)
+		self._responses += 1
+
+	async def _respond_later(self, ws, connection, response, delay):
+		await sleep(delay)
+		try:
+			await self._respond(ws, connection, response)
+		except websockets.ConnectionClosed:
+			pass
+
+	async def _pinging(self, ws, connection):
+		try:
+			while True:
+				await sleep(self._ping_interval)
+				if not connection.pong:
+					await self._disconnect(ws, 'no pong')
+					return
+				connection.pong = False
+				self._pings += 1
+				await self._send(ws, connection, {'e': 'ping', 'time': int(time.time() * 1000), })
+		except websockets.ConnectionClosed:
+			pass
+
+	async def _flooding(self, ws, connection, flood, frames):
+		loop = get_event_loop()
+		start = loop.time()
+		sent = 0
+		try:
+			while flood.count is None or sent < flood.count:
+				due = sent + 64 if flood.rate is None else int((loop.time() - start) * flood.rate) + 1
+				if flood.count is not None:
+					due = min(due, flood.count)
+				while sent < due:
+					await self._send(ws, connection, frames[sent % len(frames)])
+					sent += 1
+				# gives way to the other tasks, or waits for the next frame due
+				await sleep(0 if flood.rate is None else max(sent / flood.rate - (loop.time() - start), 0))
+		except websockets.ConnectionClosed:
+			pass
+
+	async def _send(self, ws, connection, message):
+		if self._drop_rate and self._random.random() < self._drop_rate:
+			self._dropped += 1
+			return
+		await ws.send(message if isinstance(message, str) else json.dumps(message))
+		self._frames += 1
+		connection.frames += 1
+		if self._disconnect_after is not None and connection.frames >= self._disconnect_after:
+			ws.transport.abort()
+
+	async def _disconnect(self, ws, reason):
+		await ws.send(json.dumps({'e': 'disconnecting', 'reason': reason, }))
+		await ws.close()
+
+
+class _Connection(object):
+	# State of the connection to MockServer
+	__slots__ = ('authorized', 'pong', 'frames', )
+
+	def __init__(self):
+		self.authorized = False
+		self.pong = True
+		self.frames = 0
@@ -6,13 +6,44 @@ used by :mod:`cexio.ws_client` and :mod:`cexio.rest_client`
 
 protocols_config = {
 	'ws': {
+		'codec': 'auto',  # JSON codec: 'auto', 'orjson', 'rapidjson', 'ujson', 'json'
 		'ping_after': 15,
+		# Keepalive: WebSocket ping after the connection is idle for 'keepalive_after' seconds (None - never),
+		# the connection is lost if no pong within 'keepalive_timeout'
+		'keepalive_after': 3,
+		'keepalive_timeout': 2,
 		'protocol_timeout': 3,
 		'timeout': 5,  # real 3-8, more than 18 for testing
 		'ensure_alive_timeout': 15 + 3,
 		'reconnect': True,
+		# Delay before reconnect attempt n (from 0) is min(max_delay, delay * 2 ** n), less random jitter up to a half
+		'reconnect_delay': 0.1,
+		'reconnect_max_delay': 30,
+		'resubscribe_window': 16,  # subscription requests in flight, while resubscribing after reconnect
 		'resend_subscriptions': True,
-		'resend_requests': True,
+		'resend_requests': True,  # idempotent requests in flight, others fail when connection is lost
+		'idempotent_requests': (
+			'ticker', 'get-balance', 'order-book-subscribe', 'order-book-unsubscribe',
+			'open-orders', 'get-order', 'archived-orders', 'get-position', 'open-positions',
+		),
+		'send_batch_size': 64,  # messages, encoded and written by the writer at once
+		'request_window': 16,  # requests in flight, pipelined by request_pipelined()
+		# Frames, which the router has no route for (and the default sink), found without decoding them:
+		# 'decode' - decoded and passed to the router sink, 'drop' - dropped, 'defer' - passed to on_deferred_frame()
+		'unrouted_frames': 'decode',
+		# Queue of events between the socket reader and the router, 0 - messages are routed by the reader inline;
+		# special messages (ping, ...) and responses to requests are routed by the reader inline anyway
+		'ingress_queue_size': 0,
+		'ingress_queue_policy': 'block',  # 'block', 'drop_oldest' or 'conflate'
+		'ingress_conflation': {  # conflation keys: event -> path
+			'md': 'data/pair',
+			'md_groupped': 'data/pair',
+		},
+		# Connections of WebSocketClientPool, and placement of subscriptions to them: 'hash' (by pair) or 'least_loaded'
+		'pool_size': 4,
+		'pool_placement': 'hash',
+	},
+	'rest': {
+		'codec': 'auto',
 	},
-	'rest': {},
 }
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""
+The :mod:`cexio.queues` module provides queues between CEX.IO client connection and message processing:
+IngressQueue
+create_conflation_key
+"""
+
+
+from asyncio import *
+import collections
+
+from .exceptions import *
+from .messaging import create_dict_getter
+
+
+__all__ = [
+	'BLOCK',
+	'DROP_OLDEST',
+	'CONFLATE',
+	'IngressQueue',
+	'create_conflation_key',
+]
+
+
+# Overflow policies of IngressQueue
+BLOCK, DROP_OLDEST, CONFLATE = 'block', 'drop_oldest', 'conflate'
+
+
+class IngressQueue(object):
+	"""
+	Bounded queue of received messages, with a policy applied when it is full:
+	BLOCK - put() waits until there is a room in the queue;
+	DROP_OLDEST - the oldest message in the queue is dropped;
+	CONFLATE - the message replaces the queued message with the same conflation key in its place,
+	           whether the queue is full or not; messages with no key (None) are put as with BLOCK
+	"""
+	def __init__(self, maxsize, *, policy=BLOCK, conflation_key=None):
+		if maxsize <= 0:
+			raise ConfigError("Invalid ingress queue size: {}".format(maxsize))
+		if policy not in (BLOCK, DROP_OLDEST, CONFLATE):
+			raise ConfigError("Invalid ingress queue policy: {}".format(policy))
+		if policy == CONFLATE and conflation_key is None:
+			raise ConfigError("Conflation key is required by '{}' ingress queue policy".format(policy))
+
+		self._maxsize = maxsize
+		self._policy = policy
+		self._conflation_key = conflation_key if policy == CONFLATE else None
+		self._queue = collections.deque()  # [key, message] cells
+		self._cells = {}  # key -> queued cell
+		self._getter = None
+		self._putters = collections.deque()
+
+		self._max_depth = 0
+		self._dropped = 0
+		self._conflated = 0
+		self._blocked = 0
+
+	def __len__(self):
+		return len(self._queue)
+
+	def get_stats(self):
+		return {
+			'depth': len(self._queue),
+			'max_depth': self._max_depth,
+			'dropped': self._dropped,
+			'conflated': self._conflated,
+			'blocked': self._blocked,
+		}
+
+	def clear(self):
+		self._dropped += len(self._queue)
+		self._queue.clear()
+		self._cells.clear()
+		self._wake_putters()
+
+	async def put(self, message):
+		key = None
+		if self._conflation_key is not None:
+			key = self._conflation_key(message)
+			if key is not None:
+				cell = self._cells.get(key)
+				if cell is not None:
+					cell[1] = message
+					self._conflated += 1
+					return
+
+		while len(self._queue) >= self._maxsize:
+			if self._policy == DROP_OLDEST:
+				self._drop_oldest()
+			else:
+				self._blocked += 1
+				waiter = Future()
+				self._putters.append(waiter)
+				await waiter
+
+		cell = [key, message]
+		self._queue.append(cell)
+		if key is not None:
+			self._cells[key] = cell
+		if len(self._queue) > self._max_depth:
+			self._max_depth = len(self._queue)
+
+		getter = self._getter
+		if getter is not None and not getter.done():
+			getter.set_result(None)
+
+	async def get(self):
+		while not self._queue:
+			self._getter = Future()
+			try:
+				await self._getter
+			finally:
+				self._getter = None
+
+		key, message = self._pop()
+		self._wake_putters()
+		return message
+
+	def _pop(self):
+		cell = self._queue.popleft()
+		key = cell[0]
+		if key is not None and self._cells.get(key) is cell:
+			del self._cells[key]
+		return cell
+
+	def _drop_oldest(self):
+		self._pop()
+		self._dropped += 1
+
+	def _wake_putters(self):
+		room = self._maxsize - len(self._queue)
+		while room > 0 and self._putters:
+			putter = self._putters.popleft()
+			if not putter.done():
+				putter.set_result(None)
+				room -= 1
+
+
+def create_conflation_key(paths, event_path='e'):
+	"""
+	Returns conflation key function for IngressQueue, like for {'md': 'data/pair', }
+	messages {'e': 'md', 'data': {'pair': 'BTC:USD', ...}} get ('md', 'BTC:USD') key,
+	messages of other events, or having no string value by path, are not conflated (None)
+	"""
+	get_event = create_dict_getter(event_path)
+	getters = {event: create_dict_getter(path) for event, path in paths.items()}
+
+	def conflation_key(message):
+		try:
+			event = get_event(message)
+			if event.__class__ is not str:
+				return None
+			getter = getters.get(event)
+			if getter is None:
+				return None
+			value = getter(message)
+		except (InvalidMessage, TypeError):
+			return None
+		if value.__class__ is not str:
+			return None
+		return event, value
+
+	return conflation_key
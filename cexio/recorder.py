@@ -0,0 +1,286 @@
+"""
+The :mod:`cexio.recorder` module records raw WebSocket frames of CEX.IO client sessions to append-only binary logs:
+FrameRecorder
+get_log_files
+read_records
+read_log
+read_header
+
+Log is a sequence of files '<prefix>.<n>.rec', rotated by size, each one starting with the header:
+magic (8 bytes), wall clock time (ns) and monotonic time (ns) of the file start, followed by records:
+monotonic time (ns) the frame is received or sent, flags (INBOUND/OUTBOUND, TEXT/BINARY), size, and the frame.
+Every index_interval-th record, and the first one of a file, is indexed in sidecar file '<prefix>.<n>.idx'
+by its time and offset, so records of a time range are read with no scanning from the start of the file
+"""
+
+
+import bisect
+import collections
+import glob
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .exceptions import *
+from .metrics import monotonic_ns
+
+
+__all__ = [
+	'INBOUND',
+	'OUTBOUND',
+	'TEXT',
+	'BINARY',
+	'FrameRecorder',
+	'get_log_files',
+	'read_records',
+	'read_log',
+	'read_header',
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b'CEXREC\x00\x01'
+HEADER = struct.Struct('<8sQQ')  # magic, wall clock ns, monotonic ns
+RECORD = struct.Struct('<QBI')  # monotonic ns, flags, size
+INDEX = struct.Struct('<QQ')  # monotonic ns, offset of record
+
+# Record flags
+INBOUND, OUTBOUND = 0, 1
+TEXT, BINARY = 0, 2
+
+
+class FrameRecorder(object):
+	"""
+	Records frames to the log with the given prefix (see the module), by the writer thread:
+	record() only queues time-stamped frame, the thread encodes and writes queued frames every flush_interval;
+	if more than max_pending frames are queued, new ones are dropped (and counted)
+	"""
+	def __init__(self, prefix, *, outbound=False, max_bytes=64 * 1024 * 1024, index_interval=1024,
+				 flush_interval=0.1, max_pending=1000000):
+		if max_bytes <= HEADER.size or index_interval <= 0 or flush_interval <= 0:
+			raise ConfigError("Invalid frame recorder parameters: {}, {}, {}".format(
+				max_bytes, index_interval, flush_interval))
+
+		self.outbound = outbound
+		self._prefix = prefix
+		self._max_bytes = max_bytes
+		self._index_interval = index_interval
+		self._flush_interval = flush_interval
+		self._max_pending = max_pending
+
+		self._pending = collections.deque()  # (ns, flags, frame), appended by loop, taken by writer thread
+		files = get_log_files(prefix)  # appended to existing log, after its last file (older ones may be removed)
+		self._file_no = _get_file_no(files[-1]) + 1 if files else 0
+		self._file = None
+		self._index = None
+		self._size = 0
+		self._file_records = 0
+
+		self._records = 0
+		self._bytes = 0
+		self._files = 0
+		self._dropped = 0
+		self._errors = 0
+
+		self._closing = threading.Event()
+		self._thread = threading.Thread(target=self._writing, name='cexio-recorder', daemon=True)
+		self._thread.start()
+
+	def record(self, frame, flags=INBOUND):
+		# Called from the event loop, for str or bytes frame
+		if len(self._pending) >= self._max_pending:
+			self._dropped += 1
+			return
+		self._pending.append((monotonic_ns(), flags, frame))
+
+	def close(self):
+		# Writes queued frames, and stops the writer thread
+		self._closing.set()
+		self._thread.join()
+
+	def get_stats(self):
+		return {
+			'records': self._records,
+			'bytes': self._bytes,
+			'files': self._files,
+			'pending': len(self._pending),
+			'dropped': self._dropped,
+			'errors': self._errors,
+		}
+
+	def _writing(self):
+		try:
+			while True:
+				closing = self._closing.wait(self._flush_interval)
+				try:
+					self._write_pending()
+				except Exception as ex:
+					self._errors += 1
+					logger.error("Recorder> {} ('{}') while writing".format(ex.__class__.__name__, ex))
+				if closing:
+					break
+		finally:
+			self._close_files()
+
+	def _write_pending(self):
+		pending = self._pending
+		if not pending:
+			return
+		buffer = bytearray()
+		index = bytearray()
+		while pending:
+			timestamp, flags, frame = pending.popleft()
+			if frame.__class__ is str:
+				frame = frame.encode()
+			else:
+				flags |= BINARY
+			size = RECORD.size + len(frame)
+
+			if self._file is None or self._size + len(buffer) + size > self._max_bytes and self._file_records > 0:
+				self._flush(buffer, index)
+				buffer = bytearray()
+				index = bytearray()
+				self._rotate()
+
+			if self._file_records % self._index_interval == 0:
+				index += INDEX.pack(timestamp, self._size + len(buffer))
+			buffer += RECORD.pack(timestamp, flags, len(frame))
+			buffer += frame
+			self._file_records += 1
+			self._records += 1
+		self._flush(buffer, index)
+
+	def _flush(self, buffer, index):
+		if self._file is None:
+			return
+		self._file.write(buffer)
+		self._index.write(index)
+		self._file.flush()
+		self._index.flush()
+		self._size += len(buffer)
+		self._bytes += len(buffer)
+
+	def _rotate(self):
+		self._close_files()
+		while True:
+			# existing files are never overwritten, the next number is taken then
+			path = '{}.{:06d}'.format(self._prefix, self._file_no)
+			self._file_no += 1
+			try:
+				self._file = open(path + '.rec', 'xb')
+			except FileExistsError:
+				continue
+			try:
+				self._index = open(path + '.idx', 'xb')
+			except FileExistsError:
+				self._file.close()
+				os.remove(path + '.rec')
+				self._file = None
+				continue
+			break
+		header = HEADER.pack(MAGIC, int(time.time() * 1000000000), monotonic_ns())
+		self._file.write(header)
+		self._size = len(header)
+		self._bytes += len(header)
+		self._file_records = 0
+		self._files += 1
+
+	def _close_files(self):
+		if self._file is not None:
+			self._file.close()
+			self._index.close()
+			self._file = None
+			self._index = None
+
+
+def get_log_files(prefix):
+	# Returns record files of the log, in order
+	return sorted(glob.glob(glob.escape(prefix) + '.[0-9][0-9][0-9][0-9][0-9][0-9].rec'))
+
+
+def _get_file_no(path):
+	# Returns number of the record file, like 12 of 'prefix.000012.rec'
+	return int(path[-len('000000.rec'):-len('.rec')])
+
+
+def read_records(path, start=None, end=None):
+	"""
+	Yields (ns, flags, frame) records of the record file with start <= ns < end (if given),
+	frame is str for TEXT record, bytes for BINARY one; the file is memory-mapped, not read whole
+	"""
+	with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		magic, wall_ns, monotonic_start = HEADER.unpack_from(data, 0)
+		if magic != MAGIC:
+			raise ProtocolError("Not a frame record file: {}".format(path))
+
+		offset = HEADER.size
+		if start is not None:
+			offset = _find_offset(path[:-len('.rec')] + '.idx', start, offset)
+
+		length = len(data)
+		unpack_from = RECORD.unpack_from
+		while offset + RECORD.size <= length:
+			timestamp, flags, size = unpack_from(data, offset)
+			offset += RECORD.size
+			if offset + size > length:
+				break  # incomplete record, being written
+			if end is not None and timestamp >= end:
+				break
+			if start is None or timestamp >= start:
+				frame = data[offset:offset + size]
+				yield timestamp, flags, frame if flags & BINARY else frame.decode()
+			offset += size
+
+
+def read_log(prefix, start=None, end=None):
+	"""
+	Yields (ns, flags, frame) records of all files of the log with start <= ns < end (if given),
+	skipping files out of the range by times of their first records, in the index
+	"""
+	files = get_log_files(prefix)
+	for number, path in enumerate(files):
+		if start is not None and number + 1 < len(files):
+			next_first = _get_first_timestamp(files[number + 1])
+			if next_first is not None and next_first <= start:
+				continue
+		if end is not None:
+			first = _get_first_timestamp(path)
+			if first is not None and first >= end:
+				break
+		yield from read_records(path, start, end)
+
+
+def read_header(path):
+	# Returns (magic, wall clock ns, monotonic ns) of the record file start
+	with open(path, 'rb') as file:
+		data = file.read(HEADER.size)
+	if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+		raise ProtocolError("Not a frame record file: {}".format(path))
+	return HEADER.unpack(data)
+
+
+def _get_first_timestamp(path):
+	# Returns time of the first record of the record file, by its index, None if there is no index entry
+	try:
+		with open(path[:-len('.rec')] + '.idx', 'rb') as file:
+			data = file.read(INDEX.size)
+	except OSError:
+		return None
+	return INDEX.unpack(data)[0] if len(data) == INDEX.size else None
+
+
+def _find_offset(index_path, start, default):
+	# Returns offset of the last indexed record before start, default if there is none
+	try:
+		with open(index_path, 'rb') as file:
+			data = file.read()
+	except OSError:
+		return default
+	entries = [INDEX.unpack_from(data, n) for n in range(0, len(data) - INDEX.size + 1, INDEX.size)]
+	position = bisect.bisect_left([timestamp for timestamp, offset in entries], start)
+	return entries[position - 1][1] if position > 0 else default
@@ -0,0 +1,111 @@
+"""
+The :mod:`cexio.replay` module replays session logs of :mod:`cexio.recorder` through CEX.IO WebSocket client:
+FrameReplay
+"""
+
+
+from asyncio import *
+import logging
+
+from .exceptions import *
+from .metrics import monotonic_ns
+from .recorder import *
+
+
+__all__ = [
+	'FrameReplay',
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+class FrameReplay(object):
+	"""
+	Replays inbound frames of the log with the given prefix by client.feed(), with no connection:
+	frames are filtered, decoded and routed by the client router as received by the live client.
+	speed: None - as fast as possible, 1 - in real time, N - N times faster than real time;
+	start, end - time range of frames to replay, in seconds from the first record of the log, found by the log index.
+	Frames not decoded are counted as errors and skipped, errors of handlers are raised.
+	run() returns throughput stats of the replay, also logged
+	"""
+	def __init__(self, prefix, client, *, speed=None, start=None, end=None, yield_interval=1024):
+		if speed is not None and speed <= 0:
+			raise ConfigError("Invalid replay speed: {}".format(speed))
+		first = next(read_log(prefix), None)
+		if first is None:
+			raise ConfigError("No frame log: {}".format(prefix))
+
+		self._prefix = prefix
+		self._client = client
+		self._speed = speed
+		self._yield_interval = yield_interval  # frames routed with no wait, before giving way to other tasks
+
+		# time range, in monotonic ns of the recording, from its first record
+		origin = first[0]
+		self._start = origin + int(start * 1000000000) if start is not None else None
+		self._end = origin + int(end * 1000000000) if end is not None else None
+
+		self._frames = 0
+		self._bytes = 0
+		self._skipped = 0
+		self._errors = 0
+		self._elapsed = 0
+		self._span = 0
+		self._max_lag = 0
+
+	def get_stats(self):
+		elapsed = self._elapsed / 1000000000
+		return {
+			'frames': self._frames,
+			'bytes': self._bytes,
+			'skipped': self._skipped,
+			'errors': self._errors,
+			'elapsed': elapsed,
+			'span': self._span / 1000000000,
+			'frames_per_s': self._frames / elapsed if elapsed > 0 else None,
+			'bytes_per_s': self._bytes / elapsed if elapsed > 0 else None,
+			'max_lag': self._max_lag / 1000000000,
+		}
+
+	async def run(self):
+		feed = self._client.feed
+		speed = self._speed
+		yield_interval = self._yield_interval
+		first = None
+		started = monotonic_ns()
+
+		for timestamp, flags, frame in read_log(self._prefix, self._start, self._end):
+			if flags & OUTBOUND:
+				self._skipped += 1
+				continue
+			if first is None:
+				first = timestamp
+				started = monotonic_ns()
+
+			if speed is not None:
+				# paced by recorded time, lag is how late the frame is routed
+				delay = (timestamp - first) / speed - (monotonic_ns() - started)
+				if delay > 0:
+					await sleep(delay / 1000000000)
+				else:
+					self._max_lag = max(self._max_lag, -delay)
+			elif self._frames % yield_interval == 0:
+				await sleep(0)
+
+			try:
+				await feed(frame)
+			except ProtocolError as ex:
+				self._errors += 1
+				logger.warning("Replay> Frame not decoded: {} ({})".format(frame[:64], ex))
+				continue
+			self._frames += 1
+			self._bytes += len(frame)
+			self._span = timestamp - first
+
+		self._elapsed = monotonic_ns() - started
+		stats = self.get_stats()
+		logger.info("Replay> {frames} frames ({bytes} bytes, {span:.3f} s recorded) in {elapsed:.3f} s, "
+					"{rate} frames/s, {errors} errors".format(
+						rate=int(stats['frames_per_s'] or 0), **stats))
+		return stats
@@ -2,7 +2,6 @@ import hmac
 import hashlib
 import time
 import urllib
-import json
 import datetime
 import logging
 import sys
@@ -10,7 +9,9 @@ import sys
 from asyncio import *
 import aiohttp
 
+from cexio.codec import *
 from cexio.exceptions import *
+from cexio.protocols_config import protocols_config
 
 
 logger = logging.getLogger(__name__)
@@ -79,6 +80,7 @@ class CEXRestClient:
 		headers = {'content-type': 'application/json'}
 
 		try:
+			self._codec = get_codec(protocols_config['rest']['codec'])
 			self._uri = config['rest']['uri']
 			self._need_auth = config['authorize']
 			if self._need_auth:
@@ -94,7 +96,7 @@ class CEXRestClient:
 		with aiohttp.ClientSession() as session:
 			async with session.get(url, headers=headers) as response:
 				self._validate(url, response)
-				response = await response.json()
+				response = self._codec.loads(await response.read())
 				logger.debug("REST.Resp> Response: {}".format(response))
 				return response
 
@@ -108,7 +110,7 @@ class CEXRestClient:
 
 			async with session.post(url, data=params) as response:
 				self._validate(url, response)
-				response = await response.json()
+				response = self._codec.loads(await response.read())
 				logger.debug("REST.Resp> {}".format(response))
 				return response
 
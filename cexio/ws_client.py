@@ -3,22 +3,28 @@ The :mod:`cexio.ws_client` module handles
 basic CEX.IO WebSocket futures, connectivity, authentication, reconnecting, exception handling,
 and basic functionality to build event model
 CommonWebSocketClient
+RequestPipeline
 WebSocketClientSingleCallback
 """
 import asyncio
+import collections
 import websockets
 import websockets.http
 import datetime
+import functools
 import hashlib
 import hmac
 import logging
-import json
 from asyncio import *
 import random
 import sys
 
+from .codec import *
 from .exceptions import *
 from .messaging import *
+from .metrics import Histogram, monotonic_ns
+from .queues import *
+from .recorder import OUTBOUND
 
 from .protocols_config import protocols_config
 from .version import version
@@ -26,6 +32,7 @@ from .version import version
 
 __all__ = [
 	'CommonWebSocketClient',
+	'RequestPipeline',
 	'WebSocketClientSingleCallback',
 ]
 
@@ -98,6 +105,12 @@ class CommonWebSocketClient:
 	# Append CEXIO client API version to 'user_agent' http header value
 	websockets.http.USER_AGENT = ' '.join((websockets.http.USER_AGENT, "cexio/{}".format(version)))
 
+	# Patterns of connect/auth responses, compiled once
+	_connected_pattern = MessagePattern({'e': 'connected', })
+	_auth_ok_pattern = MessagePattern({'e': 'auth', 'ok': 'ok', 'data': {'ok': 'ok'}, })
+	_auth_error_pattern = MessagePattern({'e': 'auth', 'ok': 'error', 'data': {'error': None}, })
+	_pong = RequestTemplate({'e': 'pong', })
+
 	def __init__(self, config):
 		try:
 			_config = config.copy()
@@ -118,10 +131,36 @@ class CommonWebSocketClient:
 			self._timeout = protocols_config['ws']['timeout']
 			self._protocol_timeout = protocols_config['ws']['protocol_timeout']
 			self._ensure_alive_timeout = protocols_config['ws']['ensure_alive_timeout']
+			self._keepalive_after = protocols_config['ws']['keepalive_after']
+			self._keepalive_timeout = protocols_config['ws']['keepalive_timeout']
 			self._reconnect = protocols_config['ws']['reconnect']
-			self._reconnect_interval = lambda: 0.1 + random.randrange(300) / 100
+			self._reconnect_delay = protocols_config['ws']['reconnect_delay']
+			self._reconnect_max_delay = protocols_config['ws']['reconnect_max_delay']
+			self._resubscribe_window = protocols_config['ws']['resubscribe_window']
 			self._resend_subscriptions = protocols_config['ws']['resend_subscriptions']
 			self._resend_requests = protocols_config['ws']['resend_requests']
+			self._idempotent_requests = frozenset(protocols_config['ws']['idempotent_requests'])
+			self._send_batch_size = protocols_config['ws']['send_batch_size']
+			self._request_window = protocols_config['ws']['request_window']
+			self._codec = get_codec(protocols_config['ws']['codec'])
+			logger.debug("WS> JSON codec: {}".format(self._codec.name))
+
+			self._unrouted_frames = protocols_config['ws']['unrouted_frames']
+			if self._unrouted_frames not in ('decode', 'drop', 'defer'):
+				raise ConfigError("Invalid 'unrouted_frames' value: {}".format(self._unrouted_frames))
+			self._frame_filter = None
+			self._recorder = None
+			self._received_frames = 0
+			self._dropped_frames = 0
+			self._deferred_frames = 0
+			self.deferred_frames = collections.deque(maxlen=1000)
+
+			self._ingress = None
+			if protocols_config['ws']['ingress_queue_size'] > 0:
+				self._ingress = IngressQueue(
+					protocols_config['ws']['ingress_queue_size'],
+					policy=protocols_config['ws']['ingress_queue_policy'],
+					conflation_key=create_conflation_key(protocols_config['ws']['ingress_conflation']))
 
 			if self._need_auth:
 				self._auth = CEXWebSocketAuth(config)
@@ -134,22 +173,121 @@ class CommonWebSocketClient:
 				({	'e': 'disconnecting', },									self._on_disconnecting),
 			)
 			self._router = self._base_router = MessageRouter(special_message_map)
+			# Special messages bypass ingress queue, see _bypasses_ingress()
+			self._special_matchers = tuple(compile_message_equal_or_greater(t_message)
+										   for t_message, handler in special_message_map)
+			# The same, with special messages passed unhandled, to replay frames with feed()
+			self._replay_router = MessageRouter(tuple((t_message, _pass_message) for t_message, handler in special_message_map))
 			self._resolver = None
 
 			self._connecting_lock = Lock()
 			self._listener_task = None
+			self._watchdog_task = None
+			self._dispatcher_task = None
 			self._routing_on = None
-			self._send_error = Future()
+			self._connection_lost = None  # reason, signalled out of the reading loop
+			self._last_recv_time = 0
+
+			# Outbound queue of (message, future) pairs, written by _writing() while the connection is open
+			self._outbound = collections.deque()
+			self._outbound_ready = None  # Event, set if there are messages in the queue
+			self._writable = None  # Event, set while the connection is open
+			self._writer_task = None
+			self._write_started = None  # time of the batch being written, checked by _watching()
+			self._sent = 0
+			self._sent_batches = 0
+			self._send_failed = 0
+			self._rtt = Histogram()  # ns, from written request to resolved response
+
+			# Requests in flight, future -> (request, idempotent, future of written), to resend after reconnect
+			self._pending_requests = {}
+			self._resent_requests = []
+			self._failed_requests = 0
+
+			self._pings = 0
+			self._ping_rtt = None  # ns, of the last keepalive ping
+			self._ping_rtts = Histogram()
+
+			# Reconnect timeline: ns from the connection lost to each phase of reconnect
+			self._disconnected_at = None
+			self._reconnects = 0
+			self._reconnect_attempts = 0
+			self._last_reconnect = {}
+			self._reconnect_timeline = collections.OrderedDict(
+				(phase, Histogram()) for phase in ('connected', 'authed', 'resubscribed'))
 
 		except KeyError as ex:
 			raise ConfigError('Missing key in _config file', ex)
 
 	def set_router(self, router):
 		self._router = self._base_router.bind(router)
+		self._replay_router.bind(router)
+		if self._unrouted_frames != 'decode':
+			self._frame_filter = FrameFilter((self._router, ))
 
 	def set_resolver(self, resolver):
 		self._resolver = resolver
 
+	def set_recorder(self, recorder):
+		# Sets FrameRecorder of raw frames received, and sent if its 'outbound' is set (None - not recorded)
+		self._recorder = recorder
+
+	def get_stats(self):
+		return {
+			'ingress': self._ingress.get_stats() if self._ingress is not None else None,
+			'frames': {
+				'received': self._received_frames,
+				'dropped': self._dropped_frames,
+				'deferred': self._deferred_frames,
+			},
+			'outbound': {
+				'depth': len(self._outbound),
+				'sent': self._sent,
+				'batches': self._sent_batches,
+				'failed': self._send_failed,
+			},
+			'rtt': self._rtt.get_snapshot(),
+			'requests': {
+				'pending': len(self._pending_requests),
+				'failed': self._failed_requests,
+			},
+			'keepalive': {
+				'pings': self._pings,
+				'rtt': self._ping_rtt,
+				'rtts': self._ping_rtts.get_snapshot(),
+			},
+			'reconnects': {
+				'count': self._reconnects,
+				'attempts': self._reconnect_attempts,
+				'last': dict(self._last_reconnect),
+				'timeline': {phase: histogram.get_snapshot() for phase, histogram in self._reconnect_timeline.items()},
+			},
+		}
+
+	def on_deferred_frame(self, frame):
+		# Receives raw frames, not routed if 'unrouted_frames' is 'defer', supposed to be redefined by user
+		self.deferred_frames.append(frame)
+
+	def get_request_stats(self):
+		# Returns snapshot of requests pending, expired and late, with stats by operation name ('ops'),
+		# None if the resolver is not instrumented (see RequestResponseFutureResolver, RequestStats)
+		return self._resolver.get_stats() if self._resolver is not None else None
+
+	def get_rtt(self):
+		# Returns RTT (ns) of the last keepalive ping, None if not measured yet
+		return self._ping_rtt
+
+	def decode(self, frame):
+		# Decodes raw frame, like deferred one, to message
+		return self._decode(frame)
+
+	async def feed(self, frame):
+		# Routes raw frame as if received (filtered, decoded, not recorded), used to replay recorded frames;
+		# special messages (connected, ping, ...) are not handled, nor routed to the router
+		message = self._on_frame(frame)
+		if message is not None:
+			await self._replay_router(message)
+
 	# User methods
 	# ------------
 
@@ -160,19 +298,18 @@ class CommonWebSocketClient:
 
 			self.ws = await wait_for(websockets.connect(self._uri), self._timeout)
 			self.ws.timeout = self._protocol_timeout
-
-			if not self._send_error.done():
-				self._send_error.cancel()
-			self._send_error = Future()
+			self._last_recv_time = get_event_loop().time()
 
 			message = await self.recv()
-			if message_equal_or_greater(message, {'e': 'connected', }):
+			if message_equal_or_greater(message, self._connected_pattern):
 				logger.info('WS> Client Connected')
+				self._on_reconnect_phase('connected')
 			else:
 				raise ProtocolError("WS> Client Connection failed: {}".format(message))
 
 			if self._need_auth:
 				await self._authorize()
+				self._on_reconnect_phase('authed')
 
 			self.state = OPEN
 
@@ -192,42 +329,94 @@ class CommonWebSocketClient:
 		await self.connect()
 		if self._routing_on is None:
 			self._routing_on = ensure_future(self._routing())
+		if self._ingress is not None and self._dispatcher_task is None:
+			self._dispatcher_task = ensure_future(self._dispatching())
+		if self._writer_task is None:
+			self._outbound_ready = Event()
+			self._writable = Event()
+			self._writer_task = ensure_future(self._writing())
+			if self._outbound:
+				self._outbound_ready.set()
+		self._writable.set()
 
 		logger.debug('WS.Client> Routing started')
 
 	async def stop(self):
-		if self._routing_on is not None and not self._routing_on.done():
-			self._routing_on.cancel()
+		routing_on, self._routing_on = self._routing_on, None
+		if routing_on is not None and not routing_on.done():
+			routing_on.cancel()
 
 		if self._listener_task is not None and not self._listener_task.done():
 			self._listener_task.cancel()
 
+		if self._watchdog_task is not None and not self._watchdog_task.done():
+			self._watchdog_task.cancel()
+
+		dispatcher_task, self._dispatcher_task = self._dispatcher_task, None
+		if dispatcher_task is not None and not dispatcher_task.done():
+			dispatcher_task.cancel()
+
+		self._stop_writing("Client stopped")
+
 		logger.debug('WS.Client> Routing stopped')
 		self.state = CLOSED
 		await wait_for(self.ws.close(), self._timeout)
 
-	async def send(self, message):
-		await self._connecting_lock.acquire()
-		try:
-			await self._send(message)
-		except Exception as ex:
-			raise
-		finally:
-			self._connecting_lock.release()
+	async def send(self, message, *values):
+		# message is dict, str, or RequestTemplate, rendered with values
+		if isinstance(message, RequestTemplate):
+			message = message.render(*values)
+
+		if self._writer_task is None:
+			# not running, written directly
+			await self._connecting_lock.acquire()
+			try:
+				await self._send(message)
+			except Exception as ex:
+				raise
+			finally:
+				self._connecting_lock.release()
+			return
+
+		# queued to the writer, also while reconnecting, returns time (ns) the message is written within timeout
+		return await wait_for(self._enqueue(message), self._timeout)
 
 	async def recv(self):
 		# call recv() without timeout, used only in _routing()
 		return await wait_for(self._recv(), self._timeout)
 
-	async def request(self, message):
+	async def request(self, message, *values, idempotent=None):
 		# Returns resolved and processed response data in future
+		# message is dict, or RequestTemplate with resolver key_path, rendered with request id and values;
+		# idempotent request (by default, if its name is in 'idempotent_requests') is resent after reconnect;
+		# the request is written and responded within timeout
 		future = Future()
+		loop = get_event_loop()
+		deadline = loop.time() + self._timeout
+		request_id = None
+		sent = None
 		try:
-			request = self._resolver.mark(message, future)
-			await self.send(request)
+			if self._writer_task is None:
+				await self.send(self._mark(message, future, values))  # not running, written directly
+			else:
+				request_id, sent = self._submit(message, future, values, idempotent)
+				sent = await wait_for(sent, self._timeout)
 		except Exception as ex:
-			future.set_exception(ex)
-		return await wait_for(future, self._timeout)
+			if not future.done():
+				future.set_exception(ex)
+		try:
+			result = await wait_for(future, max(deadline - loop.time(), 0))
+		except TimeoutError:
+			if request_id is not None:
+				self._resolver.add_timeout(request_id)
+			raise
+		if sent is not None:
+			self._rtt.add(monotonic_ns() - sent)
+		return result
+
+	def request_pipelined(self, messages, *, window=None):
+		# Returns RequestPipeline, keeping up to window (default 'request_window') of requests in flight
+		return RequestPipeline(self, messages, self._request_window if window is None else window)
 
 	async def send_subscribe(self, message):
 		# saving subscription requests to subscribe after reconnect
@@ -242,87 +431,344 @@ class CommonWebSocketClient:
 	# Internals
 	# ---------
 
+	def _mark(self, message, future, values=()):
+		if isinstance(message, RequestTemplate):
+			if message.key_path is None:
+				raise ConfigError("Request template has no key_path, its response can't be resolved: {}".format(
+					message.message))
+			return message.render(self._resolver.reserve(message.message, future), *values)
+		return self._resolver.mark(message, future)
+
+	def _submit(self, message, future, values=(), idempotent=None):
+		# Marks request and queues it to the writer, keeping it until resolved;
+		# returns request id and future of the time (ns) it is written.
+		# The request is encoded at once, so it is resent with its id, even if the message is marked again
+		# (like subscription request on resubscribe)
+		request = self._mark(message, future, values)
+		if isinstance(request, dict):
+			request = self._codec.dumps(request)
+		request_id = self._resolver.get_seq_id()
+		if idempotent is None:
+			op_name = message.message.get('e') if isinstance(message, RequestTemplate) else message.get('e')
+			idempotent = op_name in self._idempotent_requests
+		sent = self._enqueue(request)
+		sent.add_done_callback(functools.partial(self._on_request_sent, request_id))
+		self._pending_requests[future] = request, idempotent, sent, request_id
+		future.add_done_callback(self._on_request_done)
+		return request_id, sent
+
+	def _on_request_sent(self, request_id, sent):
+		if not sent.cancelled() and sent.exception() is None:
+			self._resolver.set_sent(request_id, sent.result())
+
+	def _on_request_done(self, future):
+		self._pending_requests.pop(future, None)
+
+	def _on_requests_lost(self):
+		# Requests written to the lost connection: idempotent ones are kept to resend after reconnect,
+		# others fail at once, as they may be executed or not; requests not written yet are written after reconnect,
+		# with no reconnect they fail at once too
+		resend = self._reconnect and self._resend_requests
+		for future, (request, idempotent, sent, request_id) in list(self._pending_requests.items()):
+			if future.done():
+				continue
+			if not sent.done():
+				if not self._reconnect:
+					# not to be written either
+					self._failed_requests += 1
+					error = ConnectivityError("Connection lost, request is not sent: {}".format(request))
+					sent.set_exception(error)
+					future.set_exception(error)
+				continue
+			if resend and idempotent:
+				self._resent_requests.append(future)
+			else:
+				self._failed_requests += 1
+				future.set_exception(ConnectivityError(
+					"Connection lost, request is not resent, its outcome is unknown: {}".format(request)))
+
+	def _resend_requests_lost(self):
+		resent, self._resent_requests = self._resent_requests, []
+		for future in resent:
+			entry = self._pending_requests.get(future)
+			if entry is None or future.done():
+				continue
+			request, idempotent, sent, request_id = entry
+			sent = self._enqueue(request)
+			sent.add_done_callback(functools.partial(self._on_request_sent, request_id))
+			sent.add_done_callback(functools.partial(_fail_on_send_error, future))
+			self._pending_requests[future] = request, idempotent, sent, request_id
+		if resent:
+			logger.info("WS> Resent {} requests".format(len(resent)))
+
+	def _enqueue(self, message):
+		# Puts message to the outbound queue, returns future of the time (ns) it is written
+		future = Future()
+		self._outbound.append((message, future))
+		if self._outbound_ready is not None:
+			self._outbound_ready.set()
+		return future
+
+	def _stop_writing(self, reason):
+		# Stops the writer, failing messages not written; send() writes directly then, as before run()
+		writer_task, self._writer_task = self._writer_task, None
+		if writer_task is not None and not writer_task.done():
+			writer_task.cancel()
+		while self._outbound:
+			message, future = self._outbound.popleft()
+			if not future.done():
+				future.set_exception(ConnectivityError(reason))
+
 	async def _send(self, message):
 		if isinstance(message, dict):
-			message = json.dumps(message)
+			message = self._codec.dumps(message)
 
 		logger.debug("WS.Client> {}".format(message))
+		if self._recorder is not None and self._recorder.outbound:
+			self._recorder.record(message, OUTBOUND)
 
 		try:
 			await wait_for(self.ws.send(message), self._timeout)
 		except Exception as ex:
-			self._send_error.set_exception(ex)  # signal to _routing() coro, which will reconnect() od stop()
+			self._on_connection_lost("while sending: {}".format(ex))  # signal to _routing(), to reconnect or stop
 			raise ConnectivityError(ex)  # signal error to client call
 
 	async def _recv(self):
-		# call ws.recv() without timeout, used only in _routing() and in tests
+		# call ws.recv() without timeout, used only in connect() and in tests
 		# not supposed to be called while running,
 		# it will simply grab the message from the queue - not exactly the one expected
-		message = await self.ws.recv()
+		frame = await self.ws.recv()
+		if self._recorder is not None:
+			self._recorder.record(frame)
+		return self._decode(frame)
+
+	def _decode(self, frame):
 		try:
-			message = json.loads(message)
+			message = self._codec.loads(frame)
 		except Exception as ex:
 			raise ProtocolError(ex)
 
-		logger.debug("WS.Server> {}".format(message))
+		logger.debug("WS.Server> %s", message)
 		return message
 
 	async def _authorize(self):
 		await self._send(self._auth.get_request())
 		response = await self.recv()
-		if message_equal(response, {'e': 'auth', 'ok': 'ok', 'data': {'ok': 'ok'}, }):
+		if message_equal(response, self._auth_ok_pattern):
 			logger.info('WS> User Authorized')
 
-		elif message_equal(response, {'e': 'auth', 'ok': 'error', 'data': {'error': None}, }):
+		elif message_equal(response, self._auth_error_pattern):
 			raise AuthError("WebSocketConnection Authentication failed: {}".format(response['data']['error']))
 		else:
 			raise ProtocolError("WebSocketConnection Authentication failed: {}".format(response))
 
 	async def _routing(self):
+		# Runs long-lived reading loop per connection, reconnecting when connection is lost;
+		# liveness and send errors are signalled out of band, by _on_connection_lost()
 		while True:
-			self._listener_task = ensure_future(self._recv())
-
-			done, pending = await wait(
-				[self._routing_on, self._listener_task, self._send_error],
-				return_when=asyncio.FIRST_COMPLETED,
-				timeout=self._ensure_alive_timeout)
+			self._connection_lost = None
+			listener_task = self._listener_task = ensure_future(self._reading())
+			self._watchdog_task = ensure_future(self._watching())
+			try:
+				# not awaited directly, so that cancelling of routing (stopped) is not taken for cancelling of the reader
+				await wait((listener_task, ))
+			except CancelledError:
+				listener_task.cancel()
+				raise
+			finally:
+				self._watchdog_task.cancel()
+
+			if listener_task.cancelled():
+				if self._connection_lost is None:
+					continue  # cancelled within message handler, the connection is alive
+				logger.info("WS> Client disconnected {}".format(self._connection_lost))
+			else:
+				ex = listener_task.exception()
+				if isinstance(ex, ProtocolError):
+					raise ex
+				logger.info("WS> Client disconnected while receiving: {}".format(ex))
+
+			if not await self._on_disconnected():
+				break
+
+	async def _reading(self):
+		loop = get_event_loop()
+		ingress = self._ingress
+		recorder = self._recorder
+		while True:
+			frame = await self.ws.recv()
+			self._last_recv_time = loop.time()
+			self._received_frames += 1
+			if recorder is not None:
+				recorder.record(frame)
+			message = self._on_frame(frame)
+			if message is None:
+				continue
+			if ingress is None or self._bypasses_ingress(message):
+				await self._router(message)
+			else:
+				await ingress.put(message)
 
-			if self._routing_on in done:
-				self._routing_on = None
+	async def _writing(self):
+		# Single writer of the outbound queue: takes messages in batches, encodes them and writes back-to-back;
+		# stalled write is detected by _watching(), which drops the connection and so fails the write
+		outbound = self._outbound
+		while True:
+			await self._outbound_ready.wait()
+			await self._writable.wait()
+
+			frames = []
+			for _ in range(min(len(outbound), self._send_batch_size)):
+				message, future = outbound.popleft()
+				if future.done():
+					continue  # send() cancelled
+				if isinstance(message, dict):
+					try:
+						message = self._codec.dumps(message)
+					except Exception as ex:
+						# with no traceback, to not hold (and let clear) the frame of the writer
+						future.set_exception(ex.with_traceback(None))
+						continue
+				frames.append((message, future))
+			if not outbound:
+				self._outbound_ready.clear()
+			if not frames:
+				continue
+
+			ws = self.ws
+			recorder = self._recorder if self._recorder is not None and self._recorder.outbound else None
+			written = 0
+			self._write_started = get_event_loop().time()
+			try:
+				for frame, future in frames:
+					logger.debug("WS.Client> %s", frame)
+					await ws.send(frame)
+					if recorder is not None:
+						recorder.record(frame, OUTBOUND)
+					written += 1
+					if not future.done():
+						future.set_result(monotonic_ns())
+			except CancelledError:
+				raise
+			except Exception as ex:
+				self._on_write_error(ws, ex, frames[written:])
+			finally:
+				self._write_started = None
+			self._sent += written
+			self._sent_batches += 1
+
+	def _on_write_error(self, ws, ex, unsent):
+		# The message being written fails, the rest are put back to the queue, to be written after reconnect
+		self._send_failed += 1
+		frame, future = unsent[0]
+		if not future.done():
+			future.set_exception(ConnectivityError(ex))
+		for item in reversed(unsent[1:]):
+			self._outbound.appendleft(item)
+		if self._outbound:
+			self._outbound_ready.set()
+		if ws is self.ws:
+			self._on_connection_lost("while sending: {}".format(ex))  # signal to _routing(), to reconnect or stop
+
+	def _bypasses_ingress(self, message):
+		# Special messages (ping, disconnecting, ...) and responses to requests are routed at once, not queued,
+		# so they are neither dropped nor conflated by ingress queue policy, nor wait behind the events
+		for match in self._special_matchers:
+			if match(message):
+				return True
+		return self._resolver is not None and self._resolver.is_response(message)
+
+	async def _dispatching(self):
+		# Routes messages from ingress queue, errors of message handlers do not affect the connection
+		while True:
+			message = await self._ingress.get()
+			try:
+				await self._router(message)
+			except CancelledError:
+				raise
+			except Exception as ex:
+				logger.error("WS> {} (\'{}\') while routing: {}".format(ex.__class__.__name__, ex, message))
+
+	async def _watching(self):
+		# Signals connection lost if nothing received within ensure_alive_timeout, or no pong to keepalive ping,
+		# sent after keepalive_after of idle, within keepalive_timeout, or if the writer is stuck on a batch longer
+		# than timeout; the dead connection is aborted, not to wait for its closing handshake
+		loop = get_event_loop()
+		while True:
+			now = loop.time()
+			idle = now - self._last_recv_time
+			if idle >= self._ensure_alive_timeout:
+				self._on_connection_dead("by timeout")
+				return
+			write_started = self._write_started
+			if write_started is not None and now - write_started >= self._timeout:
+				self._on_connection_dead("by send timeout")
 				return
 
-			elif self._send_error in done:
-				logger.info("WS> Client disconnected while sending: {}".format(self._send_error.exception()))
-
-				if not await self._on_disconnected():
-					break
-
-			elif self._listener_task in done:
-				try:
-					message = self._listener_task.result()
-					await self._router(message)
-
-				except ProtocolError:
-					raise
-				except CancelledError as ex:
-					pass
-				except Exception as ex:
-					logger.info("WS> Client disconnected while receiving: {}".format(ex))
-
-					if not await self._on_disconnected():
-						break
-
-			elif self._listener_task in pending:
-				logger.info("WS> Client timeout")
+			delay = min(self._ensure_alive_timeout - idle, self._timeout)
+			if self._keepalive_after:
+				if idle >= self._keepalive_after:
+					try:
+						await wait_for(self._keepalive(), self._keepalive_timeout)
+					except CancelledError:
+						raise
+					except Exception as ex:
+						self._on_connection_dead("by keepalive: {}".format(ex.__class__.__name__))
+						return
+					continue
+				delay = min(delay, self._keepalive_after - idle)
+			await sleep(delay)
+
+	async def _keepalive(self):
+		# Pings the connection, and so confirms it is alive, measuring RTT
+		sent = monotonic_ns()
+		pong = await self.ws.ping()
+		await pong
+		self._ping_rtt = monotonic_ns() - sent
+		self._ping_rtts.add(self._ping_rtt)
+		self._pings += 1
+		self._last_recv_time = get_event_loop().time()
+
+	def _on_frame(self, frame):
+		# Returns message of the frame received, None if the frame is not routed (see 'unrouted_frames')
+		if self._frame_filter is not None and not self._frame_filter.wants(frame):
+			self._on_unrouted_frame(frame)
+			return None
+		return self._decode(frame)
+
+	def _on_unrouted_frame(self, frame):
+		if self._unrouted_frames == 'drop':
+			self._dropped_frames += 1
+		else:
+			self._deferred_frames += 1
+			self.on_deferred_frame(frame)
+
+	def _on_connection_lost(self, reason):
+		# Stops the reading loop of lost connection, _routing() reconnects or stops then
+		if self._connection_lost is None:
+			self._connection_lost = reason
+			if self._disconnected_at is None and self._routing_on is not None:
+				self._disconnected_at = monotonic_ns()  # start of reconnect timeline
+		if self._writable is not None:
+			self._writable.clear()
+		if self._listener_task is not None and not self._listener_task.done():
+			self._listener_task.cancel()
 
-				self._listener_task.cancel()
-				if not await self._on_disconnected():
-					break
+	def _on_connection_dead(self, reason):
+		# Drops the connection with no closing handshake, so that reconnect starts at once
+		self._on_connection_lost(reason)
+		transport = getattr(self.ws, 'transport', None)
+		if transport is not None:
+			transport.abort()
 
 	async def _on_disconnected(self):
+		if self._disconnected_at is None:
+			self._disconnected_at = monotonic_ns()  # lost with no signal, like on receive error
 		try:
 			self.state = CLOSED
-			self._send_error.cancel()
+			if self._writable is not None:
+				self._writable.clear()
+			self._on_requests_lost()
 			await wait_for(self.ws.close(), self._timeout)
 
 		except Exception as ex:
@@ -330,9 +776,13 @@ class CommonWebSocketClient:
 
 		if self._reconnect:
 			logger.info("WS> Reconnecting...")
+			self._last_reconnect = {}
+			attempt = 0
 			while True:
 				try:
-					await sleep(self._reconnect_interval())
+					await sleep(self._get_reconnect_delay(attempt))
+					attempt += 1
+					self._reconnect_attempts += 1
 					await self._connecting_lock.acquire()
 					await self.connect()
 					break
@@ -341,26 +791,48 @@ class CommonWebSocketClient:
 				finally:
 					self._connecting_lock.release()
 
+			if self._writable is not None:
+				self._writable.set()
 			ensure_future(self._after_connected())
 			ret = True  # continue routing
 
 		else:
 			logger.info("WS> Client stopped")
+			self._stop_writing("Connection lost, client stopped")
+			self._disconnected_at = None
 			ret = False  # stop routing
 
 		return ret
 
+	def _get_reconnect_delay(self, attempt):
+		# Capped exponential backoff, with jitter to not reconnect all clients at once
+		delay = min(self._reconnect_max_delay, self._reconnect_delay * 2 ** min(attempt, 32))
+		return delay * (1 - random.random() / 2)
+
 	async def _after_connected(self):
+		# Resubscribes concurrently: subscriptions are queued at once, subscription requests are pipelined
+		self._resend_requests_lost()
 		try:
 			if self._resend_subscriptions:
-				for message in self._send_subscriptions:
-					await self.send(message)
-				for message in self._request_subscriptions:
-					await self.request(message)
+				await gather(*(self.send(message) for message in self._send_subscriptions))
+				pipeline = self.request_pipelined(list(self._request_subscriptions), window=self._resubscribe_window)
+				async for index, future in pipeline:
+					if not future.cancelled() and future.exception() is not None:
+						logger.info("WS> Resubscribing failed: {}".format(future.exception()))
 
 		except Exception as ex:
 			logger.info(ex)
 
+		self._on_reconnect_phase('resubscribed')
+		self._reconnects += 1
+		for phase, elapsed in self._last_reconnect.items():
+			self._reconnect_timeline[phase].add(elapsed)
+		self._disconnected_at = None
+
+	def _on_reconnect_phase(self, phase):
+		if self._disconnected_at is not None:
+			self._last_reconnect[phase] = monotonic_ns() - self._disconnected_at
+
 	# Special Message Callbacks
 	# -------------------------
 
@@ -379,15 +851,128 @@ class CommonWebSocketClient:
 		return message
 
 	async def _on_ping(self, message):
-		await self.send({'e': 'pong'})
+		await self.send(self._pong)
 		return message
 
 	async def _on_disconnecting(self, message):
 		logger.info('WS> Disconnecting by Server')
-		await self._on_disconnected()
+		self._on_connection_lost("by server")
 		return message
 
 
+async def _pass_message(message):
+	return message
+
+
+def _fail_on_send_error(future, sent):
+	# Fails the response future, if its request is not written
+	if not future.done():
+		if sent.cancelled():
+			future.cancel()
+		elif sent.exception() is not None:
+			future.set_exception(sent.exception())
+
+
+class RequestPipeline(object):
+	"""
+	Requests of the client, pipelined on its connection: up to window requests are in flight,
+	the next one is sent as soon as a response is resolved, or the request fails or times out.
+	'async for index, future in pipeline' gives done response futures in order of completion,
+	'await pipeline.gather()' - the list of results in order of requests, raising the first error:
+	no more requests are sent then, the requests in flight are not waited for.
+	cancel() stops sending the rest of requests, iteration ends with the requests in flight done;
+	messages are dicts, or RequestTemplates with resolver key_path and no other fields
+	"""
+	def __init__(self, client, messages, window):
+		if window <= 0:
+			raise ConfigError("Invalid request window: {}".format(window))
+		self._client = client
+		self._messages = enumerate(messages)
+		self._window = window
+		self._timeout = client._timeout
+		self._in_flight = 0
+		self._exhausted = False
+		self._fail_fast = False  # set by gather(), to not send requests after the first error
+		self._done = collections.deque()  # (index, future)
+		self._waiter = None
+		self._admit()
+
+	def __aiter__(self):
+		return self
+
+	async def __anext__(self):
+		while not self._done:
+			if self._exhausted and self._in_flight == 0:
+				raise StopAsyncIteration
+			self._waiter = Future()
+			try:
+				await self._waiter
+			finally:
+				self._waiter = None
+		return self._done.popleft()
+
+	async def gather(self):
+		self._fail_fast = True
+		results = {}
+		async for index, future in self:
+			if future.cancelled() or future.exception() is not None:
+				self.cancel()
+			results[index] = future.result()
+		return [results[index] for index in range(len(results))]
+
+	def cancel(self):
+		# Stops sending requests, the messages not sent yet are skipped
+		self._exhausted = True
+		waiter = self._waiter
+		if waiter is not None and not waiter.done():
+			waiter.set_result(None)
+
+	def _admit(self):
+		while self._in_flight < self._window and not self._exhausted:
+			try:
+				index, message = next(self._messages)
+			except StopIteration:
+				self._exhausted = True
+				break
+			self._start(index, message)
+
+	def _start(self, index, message):
+		future = Future()
+		try:
+			request_id, sent = self._client._submit(message, future)
+		except Exception as ex:
+			future.set_exception(ex)
+			self._on_done(index, future)
+			return
+
+		self._in_flight += 1
+		timer = get_event_loop().call_later(self._timeout, self._expire, future, request_id)
+		sent.add_done_callback(functools.partial(_fail_on_send_error, future))
+		future.add_done_callback(functools.partial(self._on_response, index, sent, timer))
+
+	def _expire(self, future, request_id):
+		if not future.done():
+			future.set_exception(TimeoutError())
+			self._client._resolver.add_timeout(request_id)
+
+	def _on_response(self, index, sent, timer, future):
+		timer.cancel()
+		self._in_flight -= 1
+		if not future.cancelled() and future.exception() is None \
+				and sent.done() and not sent.cancelled() and sent.exception() is None:
+			self._client._rtt.add(monotonic_ns() - sent.result())
+		self._on_done(index, future)
+		self._admit()
+
+	def _on_done(self, index, future):
+		if self._fail_fast and (future.cancelled() or future.exception() is not None):
+			self._exhausted = True  # not admitting the next requests
+		self._done.append((index, future))
+		waiter = self._waiter
+		if waiter is not None and not waiter.done():
+			waiter.set_result(None)
+
+
 class WebSocketClientSingleCallback(CommonWebSocketClient):
 
 	def __init__(self, _config):
@@ -407,7 +992,8 @@ class WebSocketClientSingleCallback(CommonWebSocketClient):
 			raise error
 
 		resolver = RequestResponseFutureResolver(name='', op_name_get_path='e',
-												 key_set_path='oid', key_get_path='oid')
+												 key_set_path='oid', key_get_path='oid',
+												 timeout=self._timeout, instrument=True)
 		self.message_map = (
 			({	'e': None,
 				'data': None,
@@ -0,0 +1,127 @@
+"""
+The :mod:`cexio.ws_pool` module provides pooled CEX.IO WebSocket client,
+sharding subscriptions across several connections:
+WebSocketClientPool
+get_subscription_pair
+"""
+
+
+from asyncio import *
+import itertools
+import zlib
+
+from .exceptions import *
+from .ws_client import *
+
+from .protocols_config import protocols_config
+
+
+__all__ = [
+	'HASH',
+	'LEAST_LOADED',
+	'WebSocketClientPool',
+	'get_subscription_pair',
+]
+
+
+# Placement policies of WebSocketClientPool
+HASH, LEAST_LOADED = 'hash', 'least_loaded'
+
+
+def get_subscription_pair(message):
+	"""
+	Returns pair of subscription message like 'BTC-USD', from 'data' 'pair' (['BTC', 'USD'] or 'BTC:USD'),
+	or from 'pair-BTC-USD' room, None if there is no pair in the message
+	"""
+	data = message.get('data')
+	if isinstance(data, dict):
+		pair = data.get('pair')
+		if isinstance(pair, list):
+			return '-'.join(pair)
+		elif isinstance(pair, str):
+			return pair.replace(':', '-')
+
+	rooms = message.get('rooms')
+	if isinstance(rooms, list):
+		for room in rooms:
+			if isinstance(room, str) and room.startswith('pair-'):
+				return room[5:]
+	return None
+
+
+class WebSocketClientPool(object):
+	"""
+	Pool of connections (client_class objects), each one reading, reconnecting and resubscribing on its own,
+	with messages from all of them routed by the same router and requests resolved by the same resolver.
+	Subscriptions are placed to connections by policy:
+	HASH - by pair of subscription (see get_subscription_pair()), to get all subscriptions of a pair on one connection;
+	LEAST_LOADED - to the connection with the fewest subscriptions;
+	subscriptions with no pair, with HASH policy, are placed as with LEAST_LOADED.
+	Other requests are sent by connections in turn
+	"""
+	def __init__(self, config, size=None, *, policy=None, client_class=CommonWebSocketClient,
+				 placement_key=get_subscription_pair):
+		self._size = protocols_config['ws']['pool_size'] if size is None else size
+		self._policy = protocols_config['ws']['pool_placement'] if policy is None else policy
+		if self._size <= 0:
+			raise ConfigError("Invalid connection pool size: {}".format(self._size))
+		if self._policy not in (HASH, LEAST_LOADED):
+			raise ConfigError("Invalid connection pool placement: {}".format(self._policy))
+
+		self.members = tuple(client_class(config) for _ in range(self._size))
+		self._placement_key = placement_key
+		self._turns = itertools.cycle(self.members)
+		self._resolver = None
+
+	def set_router(self, router):
+		# The router is bound to each member, after its special messages router
+		for member in self.members:
+			member.set_router(router)
+
+	def set_resolver(self, resolver):
+		self._resolver = resolver
+		for member in self.members:
+			member.set_resolver(resolver)
+
+	def get_stats(self):
+		# Load and latency per connection
+		stats = []
+		for member in self.members:
+			member_stats = member.get_stats()
+			member_stats['subscriptions'] = self._get_load(member)
+			member_stats['state'] = member.state
+			stats.append(member_stats)
+		return {
+			'members': stats,
+			'resolver': self._resolver.get_stats() if self._resolver is not None else None,
+		}
+
+	def place(self, message):
+		# Returns the member, subscription message is placed to
+		if self._policy == HASH:
+			key = self._placement_key(message)
+			if key is not None:
+				return self.members[zlib.crc32(key.encode()) % self._size]
+		return min(self.members, key=self._get_load)
+
+	async def run(self):
+		await gather(*(member.run() for member in self.members))
+
+	async def stop(self):
+		await gather(*(member.stop() for member in self.members), return_exceptions=True)
+
+	async def send(self, message, *values):
+		return await next(self._turns).send(message, *values)
+
+	async def request(self, message, *values):
+		return await next(self._turns).request(message, *values)
+
+	async def send_subscribe(self, message):
+		await self.place(message).send_subscribe(message)
+
+	async def request_subscribe(self, message):
+		return await self.place(message).request_subscribe(message)
+
+	@staticmethod
+	def _get_load(member):
+		return len(member._send_subscriptions) + len(member._request_subscriptions)
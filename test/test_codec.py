@@ -0,0 +1,60 @@
+import unittest
+
+from cexio.codec import *
+from cexio.exceptions import *
+
+
+class JsonCodecTestCase(unittest.TestCase):
+
+	message = {'e': 'md', 'data': {'pair': 'BTC:USD', 'buy': [[4000.1, 100000000], ], 'sell': [], }, 'oid': None, }
+
+	def test_codecs(self):
+		for name in ('auto', 'json', 'orjson', 'rapidjson', 'ujson'):
+			try:
+				codec = get_codec(name)
+			except ConfigError:
+				continue  # not installed
+
+			with self.subTest(codec=codec.name, case='str round trip'):
+				encoded = codec.dumps(self.message)
+				self.assertIsInstance(encoded, str)
+				self.assertEqual(codec.loads(encoded), self.message)
+
+			with self.subTest(codec=codec.name, case='decode from bytes'):
+				self.assertEqual(codec.loads(encoded.encode()), self.message)
+
+	def test_unknown_codec(self):
+		with self.assertRaises(ConfigError):
+			get_codec('unknown')
+
+
+class RequestTemplateTestCase(unittest.TestCase):
+
+	message = {'e': 'place-order', 'data': {'pair': ['BTC', 'USD'], 'type': 'buy', 'amount': None, 'price': None, }, }
+
+	def test_render(self):
+		for name in ('json', 'orjson', 'rapidjson', 'ujson'):
+			try:
+				codec = get_codec(name)
+			except ConfigError:
+				continue  # not installed
+
+			with self.subTest(codec=codec.name, case='no fields'):
+				template = RequestTemplate({'e': 'pong', }, codec=codec)
+				self.assertEqual(codec.loads(template.render()), {'e': 'pong', })
+
+			with self.subTest(codec=codec.name, case='key'):
+				template = RequestTemplate({'e': 'ticker', 'data': ['BTC', 'USD'], }, key_path='oid', codec=codec)
+				self.assertEqual(codec.loads(template.render('1_"ticker"_\\')),
+								 {'e': 'ticker', 'data': ['BTC', 'USD'], 'oid': '1_"ticker"_\\', })
+
+			with self.subTest(codec=codec.name, case='fields'):
+				template = RequestTemplate(self.message, key_path='oid', fields=('data/price', 'data/amount'), codec=codec)
+				self.assertEqual(codec.loads(template.render('1_order', '4000.1', 0.01)),
+								 {'e': 'place-order', 'oid': '1_order',
+								  'data': {'pair': ['BTC', 'USD'], 'type': 'buy', 'amount': 0.01, 'price': '4000.1', }, })
+				self.assertIsNone(self.message['data']['price'])
+
+	def test_invalid_path(self):
+		with self.assertRaises(InvalidMessage):
+			RequestTemplate({'e': 'ticker', }, fields=('data/pair', ))
@@ -1,9 +1,12 @@
 import unittest
 from unittest.mock import *
 import asyncio
+import json
+import random
 
 from cexio.exceptions import *
 from cexio.messaging import *
+from cexio.metrics import monotonic_ns
 
 
 class TestDictSetGet(unittest.TestCase):
@@ -17,6 +20,35 @@ class TestDictSetGet(unittest.TestCase):
 		setter(d, 'value')
 		self.assertEqual(getter(d), 'value')
 
+	def test_dict_getset_paths(self):
+		for path in ('a', 'a/b', 'a/b/c', 'a/b/c/d'):
+			keys = path.split('/')
+			d = value = {}
+			for key in keys[:-1]:
+				value[key] = {}
+				value = value[key]
+			getter = create_dict_getter(path)
+			setter = create_dict_setter(path)
+
+			with self.subTest(path=path, case='cached'):
+				self.assertIs(create_dict_getter(path), getter)
+				self.assertIs(create_dict_setter(path), setter)
+
+			with self.subTest(path=path, case='no value'):
+				with self.assertRaises(InvalidMessage):
+					getter(d)
+				with self.assertRaises(InvalidMessage):
+					getter({'x': {}})
+
+			with self.subTest(path=path, case='set & get'):
+				self.assertIs(setter(d, 'value'), value)
+				self.assertEqual(getter(d), 'value')
+
+			if len(keys) > 1:
+				with self.subTest(path=path, case='no dict to set to'):
+					with self.assertRaises(InvalidMessage):
+						setter({'x': {}}, 'value')
+
 
 class IsSubMessageTest(unittest.TestCase):
 
@@ -195,6 +227,58 @@ class IsSubMessageTest(unittest.TestCase):
 			message_equal_or_less(graph, graph)
 
 
+class CompiledMatcherTestCase(unittest.TestCase):
+
+	compilers = (
+		(message_equal_or_less, compile_message_equal_or_less),
+		(message_equal_or_greater, compile_message_equal_or_greater),
+		(message_equal, compile_message_equal),
+	)
+
+	def _generate(self, rnd, depth, template):
+		# random message or template of str/None/dict values, with other values in messages
+		choice = rnd.random()
+		if depth == 0 or choice < 0.3:
+			return rnd.choice(('a', 'b', None) if template else ('a', 'b', None, 1, ['a']))
+		return {rnd.choice('xyz'): self._generate(rnd, depth - 1, template) for _ in range(rnd.randrange(4))}
+
+	def test_compiled_vs_interpreted_suite(self):
+		for func_test_suite in IsSubMessageTest.match_messages:
+			for interpreted, compiler in self.compilers:
+				for t_message_suite in func_test_suite['given_t_messages']:
+					t_message = t_message_suite['t_message']
+					match = compiler(t_message)
+					pattern = MessagePattern(t_message)
+					for message_case in t_message_suite['given_messages']:
+						message = message_case['message']
+						with self.subTest(func=interpreted, message=message, t_message=t_message):
+							self.assertEqual(match(message), interpreted(message, t_message))
+							self.assertEqual(interpreted(message, pattern), interpreted(message, t_message))
+							self.assertEqual(compare_messages(message, pattern), compare_messages(message, t_message))
+
+	def test_compiled_vs_interpreted_random(self):
+		rnd = random.Random(1)
+		for _ in range(300):
+			t_message = self._generate(rnd, 3, True)
+			messages = [self._generate(rnd, 3, False) for _ in range(20)] + [t_message]
+			for interpreted, compiler in self.compilers:
+				match = compiler(t_message)
+				for message in messages:
+					with self.subTest(func=interpreted, message=message, t_message=t_message):
+						self.assertEqual(match(message), interpreted(message, t_message))
+
+	def test_deep_template(self):
+		t_message = message = {}
+		for _ in range(13):
+			t_message = {'k': t_message}
+		for interpreted, compiler in self.compilers:
+			match = compiler(t_message)
+			with self.subTest(func=interpreted):
+				self.assertEqual(match(message), interpreted(message, t_message))
+				with self.assertRaises(Exception):
+					match(t_message)
+
+
 class CallChainTestCase(unittest.TestCase):
 
 	def setUp(self):
@@ -245,6 +329,54 @@ class CallChainTestCase(unittest.TestCase):
 		self.assertTrue(CallChain.is_awaitable(gen_coro))
 
 
+	def test_chain_steps(self):
+		calls = []
+
+		def handler(name, result):
+			def handle(message):
+				calls.append(name)
+				return result(message)
+			return handle
+
+		async def async_inc(message):
+			calls.append('async_inc')
+			return message + 1
+
+		inc = handler('inc', lambda m: m + 1)
+		reject = handler('reject', lambda m: None)
+		loop = asyncio.new_event_loop()
+
+		for name, create in (('CallChain', lambda *h: CallChain(h[0]) + h[1] + h[2]), ('chain', chain)):
+			with self.subTest(chain=name, case='all handlers called'):
+				calls.clear()
+				self.assertEqual(loop.run_until_complete(create(inc, async_inc, inc)(1)), 4)
+				self.assertEqual(calls, ['inc', 'async_inc', 'inc'])
+
+			with self.subTest(chain=name, case='stop on None'):
+				calls.clear()
+				self.assertIsNone(loop.run_until_complete(create(inc, reject, async_inc)(1)))
+				self.assertEqual(calls, ['inc', 'reject'])
+
+		with self.subTest(case='bind after call'):
+			call_chain = CallChain(inc) + async_inc
+			self.assertEqual(loop.run_until_complete(call_chain(1)), 3)
+			call_chain + inc
+			self.assertEqual(loop.run_until_complete(call_chain(1)), 4)
+			call_chain.unbind()
+			self.assertEqual(loop.run_until_complete(call_chain(1)), 2)
+
+		with self.subTest(case='bind to tail after call'):
+			calls.clear()
+			head, tail = CallChain(inc), CallChain(async_inc)
+			head + tail
+			self.assertEqual(loop.run_until_complete(head(1)), 3)
+			tail + inc
+			self.assertEqual(loop.run_until_complete(head(1)), 4)
+			self.assertEqual(calls, ['inc', 'async_inc', 'inc', 'async_inc', 'inc'])
+
+		loop.close()
+
+
 class MessageIdResolverTestCase(unittest.TestCase):
 
 	def setUp(self):
@@ -380,10 +512,120 @@ class MessageIdResolverTestCase(unittest.TestCase):
 			self.assertIsInstance(f5.exception(), ErrorMessage)
 			self.assertIsNotNone(result)
 
+	async def _test_request_ids(self):
+		resolver1 = RequestResponseFutureResolver(name='name', key_get_path='id', key_set_path='id')
+		resolver2 = RequestResponseFutureResolver(name='name', key_get_path='id', key_set_path='id')
+		f1 = asyncio.Future()
+		f2 = asyncio.Future()
+		id1 = resolver1.mark(					{'e': 'ticker', }, f1)['id']
+		id2 = resolver2.mark(					{'e': 'ticker', }, f2)['id']
+
+		with self.subTest(case='unique ids'):
+			self.assertNotEqual(id1, id2)
+			self.assertEqual(resolver1.get_request_key(id1), 1)
+			self.assertIsNone(resolver1.get_request_key(id2))
+			self.assertIsNone(resolver1.get_request_key(id1 + 'x'))
+			self.assertIsNone(resolver1.get_request_key(None))
+
+		with self.subTest(case='responses'):
+			self.assertTrue(resolver1.is_response(	{'id': id1, }))
+			self.assertFalse(resolver1.is_response(	{'id': id2, }))
+			self.assertFalse(resolver1.is_response(	{'e': 'ticker', }))
+
+		with self.subTest(case='resolved by own resolver only'):
+			self.assertIsNone(await resolver1(	{'id': id2, }))
+			self.assertEqual(await resolver2(	{'id': id2, }), {'id': id2, })
+			self.assertFalse(f1.done())
+			self.assertTrue(f2.done())
+
+	async def _test_resolver_expiry(self):
+		late_messages = []
+
+		async def late_sink(m):
+			late_messages.append(m)
+			return m
+
+		resolver = RequestResponseFutureResolver(name='', key_get_path='id', key_set_path='id',
+												 timeout=0, late_sink=late_sink, instrument=True)
+		f1 = asyncio.Future()
+		f2 = asyncio.Future()
+		id1 = resolver.mark(					{'message': '1', }, f1)['id']
+		id2 = resolver.mark(					{'message': '2', }, f2)['id']
+
+		with self.subTest(case='expired on next mark'):
+			self.assertIsInstance(f1.exception(), asyncio.TimeoutError)
+			self.assertFalse(f2.done())
+			self.assertEqual(self._get_counts(resolver), {'live': 1, 'expired': 1, 'late': 0, })
+
+		with self.subTest(case='expired on response'):
+			result = await resolver(			{'id': 'undefined', })
+			self.assertIsNone(result)
+			self.assertIsInstance(f2.exception(), asyncio.TimeoutError)
+			self.assertEqual(self._get_counts(resolver), {'live': 0, 'expired': 2, 'late': 0, })
+
+		with self.subTest(case='late response'):
+			result = await resolver(			{'id': id1, })
+			self.assertEqual(result,			{'id': id1, })
+			self.assertEqual(late_messages,		[{'id': id1, }])
+			self.assertEqual(self._get_counts(resolver), {'live': 0, 'expired': 2, 'late': 1, })
+			self.assertEqual(resolver.get_stats()['ops']['']['timeouts'], 2)
+
+		with self.subTest(case='cancelled request'):
+			resolver = RequestResponseFutureResolver(name='', key_get_path='id', key_set_path='id',
+													 timeout=60, late_sink=late_sink, instrument=True)
+			f3 = asyncio.Future()
+			id3 = resolver.mark(				{'message': '3', }, f3)['id']
+			f3.cancel()
+			result = await resolver(			{'id': id3, })
+			self.assertEqual(result,			{'id': id3, })
+			self.assertEqual(self._get_counts(resolver), {'live': 0, 'expired': 0, 'late': 1, })
+			self.assertEqual(resolver.get_stats()['ops']['']['late'], 1)
+
+	@staticmethod
+	def _get_counts(resolver):
+		stats = resolver.get_stats()
+		del stats['ops']
+		return stats
+
+	async def _test_resolver_stats(self):
+		def validator(m):
+			if m['ok'] == 'error':
+				raise ErrorMessage(m['data'])
+			return m['data']
+
+		resolver = RequestResponseFutureResolver(name='', op_name_get_path='e', key_get_path='oid', key_set_path='oid',
+												 instrument=True)
+		resolver + validator
+		requests = [resolver.mark({'e': e, }, asyncio.Future()) for e in ('ticker', 'ticker', 'place-order', 'ticker')]
+		resolver.set_sent(requests[0]['oid'], monotonic_ns())
+		await resolver({'e': 'ticker', 'oid': requests[0]['oid'], 'ok': 'ok', 'data': 1, })
+		await resolver({'e': 'ticker', 'oid': requests[1]['oid'], 'ok': 'ok', 'data': 2, })
+		await resolver({'e': 'place-order', 'oid': requests[2]['oid'], 'ok': 'error', 'data': 'Error', })
+		resolver.add_timeout(requests[3]['oid'])
+
+		ops = resolver.get_stats()['ops']
+		self.assertEqual(sorted(ops), ['place-order', 'ticker'])
+		ticker = ops['ticker']
+		self.assertEqual((ticker['requests'], ticker['errors'], ticker['timeouts']), (2, 0, 1))
+		self.assertEqual(ticker['total']['count'], 2)
+		self.assertEqual(ticker['handler']['count'], 2)
+		self.assertEqual(ticker['wire']['count'], 1)  # written time is set for one
+		self.assertEqual(ticker['queue']['count'], 1)
+		self.assertEqual((ops['place-order']['requests'], ops['place-order']['errors']), (1, 1))
+
+		resolver = RequestResponseFutureResolver(name='', key_get_path='oid', key_set_path='oid')
+		request = resolver.mark({}, asyncio.Future())
+		resolver.set_sent(request['oid'], monotonic_ns())
+		await resolver({'oid': request['oid'], })
+		self.assertIsNone(resolver.get_stats()['ops'])
+
 	async def run_all(self):
 		await self._test_message_id_resolver1()
 		await self._test_message_id_resolver2()
 		await self._test_resolver_with_next_calls()
+		await self._test_request_ids()
+		await self._test_resolver_expiry()
+		await self._test_resolver_stats()
 
 	def test_async(self):
 		loop = asyncio.new_event_loop()
@@ -538,3 +780,355 @@ class MessageRouterAndChainCallTest(unittest.TestCase):
 		MessageRouterAndChainCallTest.__on_connected	.assert_called_once_with({'e': 'connected'})
 
 		loop.close()
+
+
+class IndexedMessageRouterTestCase(unittest.TestCase):
+
+	messages = (
+		{'e': 'tick', 'data': {'pair': 'BTC:USD', }, },
+		{'e': 'md', 'data': {'pair': 'BTC:USD', }, },
+		{'e': 'md', 'data': {'pair': 'ETH:USD', }, },
+		{'e': 'history', },
+		{'e': {'nested': 'e'}, },
+		{'e': None, },
+		{'data': {'pair': 'BTC:USD', }, },
+		{'e': 'unknown', },
+		{},
+	)
+
+	def _create_routers(self, index_path, **kwargs):
+		calls = []
+
+		def handler(name, result=True):
+			async def handle(message):
+				calls.append((name, message))
+				return message if result else None
+			return handle
+
+		async def sink(message):
+			calls.append(('sink', message))
+
+		rmap = (
+			({'e': 'tick', }, handler('tick')),
+			({'e': 'md', 'data': {'pair': 'ETH:USD', }, }, handler('md ETH')),
+			({'e': None, 'data': None, }, handler('any with data', result=False)),
+			({'e': 'md', }, handler('md')),
+			({'e': 'history', }, handler('history')),
+			({'data': {'pair': 'BTC:USD'}, }, handler('BTC')),
+			({'e': None, }, handler('any')),
+		)
+		return (MessageRouter(rmap, sink=sink, **kwargs), MessageRouter(rmap, sink=sink, index_path=index_path, **kwargs)), calls
+
+	def test_same_routing(self):
+		loop = asyncio.new_event_loop()
+		for index_path in ('e', 'data/pair'):
+			for strict_match in (False, True):
+				(router, indexed_router), calls = self._create_routers(index_path, strict_match=strict_match)
+				for message in self.messages:
+					with self.subTest(index_path=index_path, strict_match=strict_match, message=message):
+						loop.run_until_complete(router(message))
+						expected = list(calls)
+						calls.clear()
+						loop.run_until_complete(indexed_router(message))
+						self.assertEqual(calls, expected)
+						calls.clear()
+		loop.close()
+
+	def test_modified_routes(self):
+		async def handler(message):
+			return 'H'
+
+		async def other(message):
+			return 'O'
+
+		async def sink(message):
+			return 'S'
+
+		loop = asyncio.new_event_loop()
+		for index_path in (None, 'e'):
+			with self.subTest(index_path=index_path):
+				router = MessageRouter((), sink=sink, index_path=index_path)
+				self.assertEqual(loop.run_until_complete(router({'e': 'tick', })), 'S')
+				router.append(({'e': 'tick', }, handler))
+				self.assertEqual(loop.run_until_complete(router({'e': 'tick', })), 'H')
+				router.insert(0, ({'e': 'tick', }, other))
+				self.assertEqual(loop.run_until_complete(router({'e': 'tick', })), 'O')
+				self.assertEqual(loop.run_until_complete(router.dispatch_many([{'e': 'tick', }])), ['O'])
+				del router[0]
+				self.assertEqual(loop.run_until_complete(router({'e': 'tick', })), 'H')
+				router[0] = ({'e': 'md', }, other)
+				self.assertEqual(loop.run_until_complete(router({'e': 'tick', })), 'S')
+				self.assertEqual(loop.run_until_complete(router({'e': 'md', })), 'O')
+				router.clear()
+				self.assertEqual(loop.run_until_complete(router({'e': 'md', })), 'S')
+		loop.close()
+
+	def test_pattern_routes(self):
+		async def handler(message):
+			return 'H'
+
+		async def sink(message):
+			return 'S'
+
+		loop = asyncio.new_event_loop()
+		for index_path in (None, 'e'):
+			with self.subTest(index_path=index_path):
+				router = MessageRouter(((MessagePattern({'e': 'tick', 'data': None, }), handler), ),
+									   sink=sink, index_path=index_path)
+				self.assertEqual(loop.run_until_complete(router({'e': 'tick', 'data': {}, })), 'H')
+				self.assertEqual(loop.run_until_complete(router({'e': 'md', 'data': {}, })), 'S')
+		frame_filter = FrameFilter((MessageRouter(((MessagePattern({'e': 'tick', 'data': None, }), handler), )), ))
+		self.assertTrue(frame_filter.wants('{"e":"tick","data":{}}'))
+		self.assertFalse(frame_filter.wants('{"e":"md","data":{}}'))
+		loop.close()
+
+
+class InstrumentationTestCase(unittest.TestCase):
+
+	def test_router_and_chain_stats(self):
+		async def accept(message):
+			return message
+
+		async def reject(message):
+			return None
+
+		call_chain = CallChain(accept, instrument=True) + reject
+		router = MessageRouter((
+			({'e': 'tick', }, call_chain),
+			({'e': None, }, accept),
+		), sink=accept, instrument=True)
+
+		loop = asyncio.new_event_loop()
+		for message in ({'e': 'tick', }, {'e': 'md', }, {'e': 'tick', }, {}):
+			loop.run_until_complete(router(message))
+		loop.close()
+
+		stats = router.get_stats()
+		self.assertEqual(stats['messages'], 4)
+		self.assertEqual(stats['sink'], 1)
+		self.assertEqual([(r['calls'], r['rejected']) for r in stats['routes']], [(2, 2), (3, 0)])
+		self.assertEqual(stats['routes'][0]['latency']['count'], 2)
+
+		stats = call_chain.get_stats()
+		self.assertEqual([(s['calls'], s['rejected']) for s in stats['steps']], [(2, 0), (2, 2)])
+
+		self.assertIsNone(MessageRouter(()).get_stats())
+		self.assertIsNone(CallChain(accept).get_stats())
+
+
+class DispatchManyTestCase(unittest.TestCase):
+
+	messages = (
+		{'e': 'history', 'n': '1', },
+		{'e': 'tick', 'n': '2', },
+		{'e': 'history', 'n': '3', },
+		{'e': 'unknown', 'n': '4', },
+		{'e': 'tick', 'n': '5', 'reject': '', },
+		{'e': 'history', 'n': '6', },
+	)
+
+	def _create_router(self, calls, **kwargs):
+		async def history(messages):
+			calls.append(('history', [m['n'] for m in messages]))
+			return messages
+
+		async def tick(message):
+			calls.append(('tick', [message['n']]))
+			return None if 'reject' in message else message
+
+		def validate(message):
+			calls.append(('validate', [message['n']]))
+			return message
+
+		async def any_event(message):
+			calls.append(('any', [message['n']]))
+			return message
+
+		async def sink(message):
+			calls.append(('sink', [message['n']]))
+			return message
+
+		return MessageRouter((
+			({'e': 'history', }, CallChain(validate) + BatchHandler(history)),
+			({'e': 'tick', }, tick),
+			({'e': 'tick', 'reject': None, }, any_event),
+		), sink=sink, **kwargs)
+
+	def test_dispatch_many(self):
+		loop = asyncio.new_event_loop()
+		for kwargs in ({}, {'index_path': 'e', }, {'instrument': True, }):
+			calls = []
+			router = self._create_router(calls, **kwargs)
+			expected = [loop.run_until_complete(router(message)) for message in self.messages]
+			calls.clear()
+
+			with self.subTest(case='same results', **kwargs):
+				results = loop.run_until_complete(router.dispatch_many(self.messages))
+				self.assertEqual(results, expected)
+
+			with self.subTest(case='grouped calls', **kwargs):
+				self.assertEqual(calls, [
+					('validate', ['1']), ('validate', ['3']), ('validate', ['6']),
+					('history', ['1', '3', '6']),
+					('tick', ['2']), ('tick', ['5']),
+					('any', ['5']),
+					('sink', ['4']),
+				])
+
+		with self.subTest(case='rejected before wildcard route'):
+			calls = []
+
+			async def reject_first(message):
+				return None if message['n'] == 1 else message
+
+			async def any_event(message):
+				calls.append(message['n'])
+				return message
+
+			for kwargs in ({}, {'index_path': 'e', }):
+				calls.clear()
+				router = MessageRouter((({'e': 'a', }, reject_first), ({'e': None, }, any_event)), **kwargs)
+				messages = [{'e': 'a', 'n': 1, }, {'e': 'b', 'n': 2, }]
+				loop.run_until_complete(router.dispatch_many(messages))
+				self.assertEqual(calls, [1, 2])
+
+		with self.subTest(case='chain rejects'):
+			call_chain = CallChain(lambda m: m if m % 2 else None) + BatchHandler(lambda ms: asyncio.sleep(0, ms))
+			results = loop.run_until_complete(call_chain.dispatch_many([1, 2, 3]))
+			self.assertEqual(results, [1, None, 3])
+		loop.close()
+
+
+class BroadcastTestCase(unittest.TestCase):
+
+	async def _test_broadcast(self):
+		calls = []
+
+		def cache(message):
+			calls.append('cache')
+			return message
+
+		async def strategy(message):
+			await asyncio.sleep(0.01)
+			calls.append('strategy')
+			return 'order'
+
+		async def recorder(message):
+			await asyncio.sleep(0.02)
+			calls.append('recorder')
+
+		async def slow(message):
+			await asyncio.sleep(10)
+
+		async def failing(message):
+			raise ValueError(message)
+
+		broadcast = Broadcast((
+			(cache, {'critical': True, }),
+			(strategy, {'critical': True, }),
+			recorder,
+			(slow, {'timeout': 0.01, }),
+			failing,
+		), timeout=1)
+
+		with self.subTest(case='waits for critical only'):
+			result = await broadcast({'e': 'tick', })
+			self.assertEqual(result, [{'e': 'tick', }, 'order'])
+			self.assertEqual(calls, ['cache', 'strategy'])
+
+		with self.subTest(case='background handlers isolated'):
+			await broadcast.join()
+			self.assertEqual(calls, ['cache', 'strategy', 'recorder'])
+			self.assertEqual(broadcast.get_stats(), {'errors': 1, 'timeouts': 1, 'background': 0, })
+
+		with self.subTest(case='critical failed'):
+			broadcast = Broadcast((failing, (slow, {'timeout': 0.01, }), ), critical=True)
+			self.assertIsNone(await broadcast({'e': 'tick', }))
+
+		with self.subTest(case='routed'):
+			broadcast = Broadcast((recorder, ))
+			router = MessageRouter((({'e': 'tick', }, broadcast), ))
+			self.assertEqual(await router({'e': 'tick', }), {'e': 'tick', })
+			await broadcast.join()
+
+	def test_async(self):
+		loop = asyncio.new_event_loop()
+		loop.run_until_complete(self._test_broadcast())
+		loop.close()
+
+
+class FrameFilterTestCase(unittest.TestCase):
+
+	frames = (
+		'{"e":"md","data":{"pair":"BTC:USD","buy":[[4000.1,1]]}}',
+		'{"e": "md", "data": {"pair": "ETH:USD"}}',
+		'{"e":"tick","data":{"symbol1":"BTC","symbol2":"USD","price":"4000.1"}}',
+		'{"e":"ticker","data":{"pair":["BTC","USD"]},"oid":"1_ticker","ok":"ok"}',
+		'{"e":"history","data":[]}',
+		'{"e":"ping","time":1}',
+		'{"e":"m\\"d","data":{}}',
+		'{"data":{"error":"Please Login"},"ok":"error"}',
+		'{"ok":"ok","e":"history","data":[]}',
+	)
+
+	def test_peek_event(self):
+		self.assertEqual(peek_event(self.frames[0]), 'md')
+		self.assertEqual(peek_event(self.frames[1]), 'md')
+		self.assertIsNone(peek_event(self.frames[6]))
+		self.assertIsNone(peek_event(self.frames[7]))
+		self.assertIsNone(peek_event(self.frames[8]))
+		self.assertIsNone(peek_event(b'{"e":"md"}'))
+
+	def test_wanted_if_routed(self):
+		async def handler(message):
+			return message
+
+		routers = (
+			MessageRouter((
+				({'e': 'md', 'data': {'pair': 'BTC:USD', }, }, handler),
+				({'e': None, 'data': None, 'oid': None, 'ok': None, }, handler),
+			)),
+			MessageRouter((
+				({'e': 'ping', }, handler),
+				({'ok': 'error', 'data': {'error': 'Please Login'}, }, handler),
+			), sink=MessageRouter((({'e': 'tick', }, handler), ))),
+			MessageRouter((({}, handler), )),
+			MessageRouter((({'e': 'history', }, handler), ), strict_match=True),
+		)
+
+		for router in routers:
+			frame_filter = FrameFilter((router, ))
+			for frame in self.frames:
+				message = json.loads(frame)
+				routed = any(
+					message_equal_or_greater(message, t_message)
+					for r in (router, router.get_sink()) if isinstance(r, MessageRouter)
+					for t_message, h in r)
+				with self.subTest(router=router, frame=frame):
+					if routed:
+						self.assertTrue(frame_filter.wants(frame))
+
+		with self.subTest(case='not wanted'):
+			frame_filter = FrameFilter(routers[:2])
+			self.assertFalse(frame_filter.wants(self.frames[4]))
+			self.assertFalse(FrameFilter(routers[:1]).wants(self.frames[5]))
+			self.assertTrue(frame_filter.wants(self.frames[1]))
+			self.assertTrue(frame_filter.wants(self.frames[0]))
+			self.assertTrue(frame_filter.wants(self.frames[2]))
+			self.assertTrue(frame_filter.wants(self.frames[3]))
+
+		with self.subTest(case='sink'):
+			frame_filter = FrameFilter((MessageRouter((({'e': 'ping', }, handler), ), sink=handler), ))
+			self.assertTrue(frame_filter.wants(self.frames[4]))
+
+		with self.subTest(case='router modified'):
+			sink = MessageRouter((({'e': 'ping', }, handler), ))
+			router = MessageRouter((({'e': 'tick', }, handler), ), sink=sink)
+			frame_filter = FrameFilter((router, ))
+			self.assertFalse(frame_filter.wants(self.frames[0]))
+			sink.append(({'e': 'md', }, handler))
+			self.assertTrue(frame_filter.wants(self.frames[0]))
+			del sink[1]
+			self.assertFalse(frame_filter.wants(self.frames[0]))
+			router.bind(handler)
+			self.assertTrue(frame_filter.wants(self.frames[4]))
@@ -0,0 +1,163 @@
+import asyncio
+import unittest
+
+from cexio.exceptions import *
+from cexio.mock_server import *
+from cexio.ws_client import *
+
+
+class NotifiedClient(WebSocketClientSingleCallback):
+	# Keeps notifications received
+
+	def __init__(self, config):
+		self.notifications = []
+		super().__init__(config)
+
+	async def on_notification(self, message):
+		self.notifications.append(message)
+		return message
+
+
+class MockServerTestCase(unittest.TestCase):
+
+	credentials = {'key': 'secret', }
+
+	async def _start(self, **kwargs):
+		server = MockServer(**kwargs)
+		await server.start()
+		return server
+
+	async def _connect(self, server, auth=None, **kwargs):
+		config = {'ws': {'uri': server.uri, }, 'authorize': auth is not None, }
+		if auth is not None:
+			config['auth'] = auth
+		client = NotifiedClient(config)
+		for name, value in kwargs.items():
+			setattr(client, name, value)
+		await client.run()
+		return client
+
+	async def _wait(self, condition, timeout=5):
+		for _ in range(int(timeout / 0.01)):
+			if condition():
+				return
+			await asyncio.sleep(0.01)
+		self.fail("Not met in {} s".format(timeout))
+
+	async def _test_request(self):
+		server = await self._start()
+		client = await self._connect(server)
+		try:
+			data = await client.request({'e': 'ticker', 'data': ['BTC', 'USD'], })
+			self.assertEqual(data, ['BTC', 'USD'])
+			self.assertEqual(server.get_stats()['responses'], 1)
+		finally:
+			await client.stop()
+			await server.stop()
+
+	async def _test_auth(self):
+		server = await self._start(credentials=self.credentials)
+		client = await self._connect(server, {'key': 'key', 'secret': 'secret', })
+		try:
+			self.assertEqual(await client.request({'e': 'get-balance', 'data': {}, }), {})
+		finally:
+			await client.stop()
+
+		for auth in ({'key': 'key', 'secret': 'wrong', }, {'key': 'other', 'secret': 'secret', }):
+			with self.subTest(auth=auth):
+				with self.assertRaises(AuthError):
+					await self._connect(server, auth)
+		self.assertEqual((server.get_stats()['auths'], server.get_stats()['auth_errors']), (3, 2))
+		await server.stop()
+
+	async def _test_flood(self):
+		server = await self._start(floods=(Flood('tick', count=500), Flood('md', rate=200, count=20, size=10)))
+		loop = asyncio.get_event_loop()
+		start = loop.time()
+		client = await self._connect(server)
+		try:
+			await self._wait(lambda: len(client.notifications) == 520)
+			self.assertGreater(loop.time() - start, 19 / 200)
+			md = [message for message in client.notifications if message['e'] == 'md']
+			self.assertEqual(len(md), 20)
+			self.assertEqual(len(md[0]['data']['buy']), 10)
+		finally:
+			await client.stop()
+			await server.stop()
+
+	async def _test_ping(self):
+		server = await self._start(ping_interval=0.02)
+		client = await self._connect(server)
+		try:
+			await self._wait(lambda: server.get_stats()['pongs'] >= 3)
+			self.assertEqual(server.get_stats()['connections'], 1)
+		finally:
+			await client.stop()
+			await server.stop()
+
+	async def _test_drops_and_delays(self):
+		server = await self._start(floods=(Flood('tick', count=200), ), drop_rate=0.5, seed=1)
+		client = await self._connect(server)
+		try:
+			await self._wait(lambda: server.get_stats()['frames'] + server.get_stats()['dropped'] == 200)
+			await self._wait(lambda: len(client.notifications) == server.get_stats()['frames'])
+			self.assertGreater(server.get_stats()['dropped'], 50)
+		finally:
+			await client.stop()
+			await server.stop()
+
+		server = await self._start(delay=0.05, delay_jitter=0.01)
+		client = await self._connect(server)
+		loop = asyncio.get_event_loop()
+		try:
+			start = loop.time()
+			await asyncio.gather(*(client.request({'e': 'ticker', 'data': [str(n), 'USD'], }) for n in range(5)))
+			self.assertGreaterEqual(loop.time() - start, 0.05)
+		finally:
+			await client.stop()
+			await server.stop()
+
+	async def _test_reconnect(self):
+		server = await self._start(floods=(Flood('tick', count=10), ))
+		client = await self._connect(server, _reconnect_delay=0.01)
+		try:
+			await self._wait(lambda: len(client.notifications) == 10)
+			await server.disconnect()
+			await self._wait(lambda: len(client.notifications) == 20)
+			server.drop_connections()
+			await self._wait(lambda: len(client.notifications) == 30)
+			self.assertEqual(server.get_stats()['connected'], 3)
+		finally:
+			await client.stop()
+			await server.stop()
+
+		server = await self._start(floods=(Flood('tick', count=10), ), disconnect_after=5)
+		client = await self._connect(server, _reconnect_delay=0.01)
+		try:
+			await self._wait(lambda: server.get_stats()['connected'] >= 3)
+		finally:
+			await client.stop()
+			await server.stop()
+
+	def test_async(self):
+		loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		for test in (self._test_request, self._test_auth, self._test_flood, self._test_ping,
+					 self._test_drops_and_delays, self._test_reconnect):
+			with self.subTest(test=test.__name__):
+				loop.run_until_complete(test())
+		loop.close()
+
+	def test_flood_message(self):
+		for event, size, key in (('md', 5, 'buy'), ('md_groupped', 5, 'sell'), ('history', 7, None),
+								 ('history-update', 3, None)):
+			with self.subTest(event=event):
+				message = create_flood_message(event, 1, size)
+				self.assertEqual(message['e'], event)
+				self.assertEqual(len(message['data'][key] if key is not None else message['data']), size)
+		with self.assertRaises(ConfigError):
+			create_flood_message('unknown')
+
+
+if __name__ == '__main__':
+	unittest.main()
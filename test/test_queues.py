@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+
+from cexio.exceptions import *
+from cexio.queues import *
+
+
+class IngressQueueTestCase(unittest.TestCase):
+
+	conflation_key = staticmethod(create_conflation_key({'md': 'data/pair', }))
+
+	def md(self, pair, n):
+		return {'e': 'md', 'data': {'pair': pair, 'id': n, }, }
+
+	async def _get_all(self, queue):
+		messages = []
+		while len(queue) > 0:
+			messages.append(await queue.get())
+		return messages
+
+	async def _test_drop_oldest(self):
+		queue = IngressQueue(2, policy=DROP_OLDEST)
+		for n in range(4):
+			await queue.put({'n': n, })
+		self.assertEqual(await self._get_all(queue), [{'n': 2, }, {'n': 3, }])
+		self.assertEqual(queue.get_stats(), {'depth': 0, 'max_depth': 2, 'dropped': 2, 'conflated': 0, 'blocked': 0, })
+
+	async def _test_conflate(self):
+		queue = IngressQueue(3, policy=CONFLATE, conflation_key=self.conflation_key)
+		await queue.put(self.md('BTC:USD', 1))
+		await queue.put({'e': 'tick', })
+		await queue.put(self.md('ETH:USD', 2))
+		await queue.put(self.md('BTC:USD', 3))
+		await queue.put(self.md('BTC:USD', 4))
+		self.assertEqual(await self._get_all(queue), [self.md('BTC:USD', 4), {'e': 'tick', }, self.md('ETH:USD', 2)])
+		self.assertEqual(queue.get_stats()['conflated'], 2)
+
+		# once taken out, the message is not conflated
+		await queue.put(self.md('BTC:USD', 5))
+		self.assertEqual(await queue.get(), self.md('BTC:USD', 5))
+		await queue.put(self.md('BTC:USD', 6))
+		self.assertEqual(await queue.get(), self.md('BTC:USD', 6))
+
+	async def _test_block(self):
+		queue = IngressQueue(1)
+		await queue.put({'n': 1, })
+		put = asyncio.ensure_future(queue.put({'n': 2, }))
+		await asyncio.sleep(0)
+		self.assertFalse(put.done())
+		self.assertEqual(await queue.get(), {'n': 1, })
+		await put
+		self.assertEqual(await queue.get(), {'n': 2, })
+		self.assertEqual(queue.get_stats()['blocked'], 1)
+
+		get = asyncio.ensure_future(queue.get())
+		await asyncio.sleep(0)
+		self.assertFalse(get.done())
+		await queue.put({'n': 3, })
+		self.assertEqual(await get, {'n': 3, })
+
+	def test_async(self):
+		loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		for test in (self._test_drop_oldest, self._test_conflate, self._test_block):
+			with self.subTest(test=test.__name__):
+				loop.run_until_complete(test())
+		loop.close()
+
+	def test_conflation_key(self):
+		self.assertEqual(self.conflation_key(self.md('BTC:USD', 1)), ('md', 'BTC:USD'))
+		self.assertIsNone(self.conflation_key({'e': 'md', }))
+		self.assertIsNone(self.conflation_key({'e': 'tick', 'data': {'pair': 'BTC:USD', }, }))
+		self.assertIsNone(self.conflation_key({'e': {'md': 'md'}, }))
+		self.assertIsNone(self.conflation_key([]))
+
+	def test_config(self):
+		with self.assertRaises(ConfigError):
+			IngressQueue(0)
+		with self.assertRaises(ConfigError):
+			IngressQueue(1, policy='unknown')
+		with self.assertRaises(ConfigError):
+			IngressQueue(1, policy=CONFLATE)
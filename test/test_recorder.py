@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cexio.exceptions import *
+from cexio.recorder import *
+
+
+class FrameRecorderTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.prefix = os.path.join(self.directory, 'session')
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def _read_all(self, start=None, end=None):
+		records = []
+		for path in get_log_files(self.prefix):
+			records.extend(read_records(path, start, end))
+		return records
+
+	def test_record(self):
+		recorder = FrameRecorder(self.prefix, outbound=True)
+		recorder.record('{"e":"connected"}')
+		recorder.record('{"e":"ticker","oid":"1"}', OUTBOUND)
+		recorder.record(b'\x00\x01')
+		recorder.close()
+
+		records = self._read_all()
+		self.assertEqual([(flags, frame) for timestamp, flags, frame in records], [
+			(INBOUND | TEXT, '{"e":"connected"}'),
+			(OUTBOUND | TEXT, '{"e":"ticker","oid":"1"}'),
+			(INBOUND | BINARY, b'\x00\x01'),
+		])
+		timestamps = [timestamp for timestamp, flags, frame in records]
+		self.assertEqual(timestamps, sorted(timestamps))
+		self.assertEqual(recorder.get_stats()['records'], 3)
+
+	def test_rotate_and_slice(self):
+		recorder = FrameRecorder(self.prefix, max_bytes=1024, index_interval=4)
+		frames = ['{{"e":"tick","n":{}}}'.format(n) for n in range(200)]
+		for frame in frames:
+			recorder.record(frame)
+		recorder.close()
+
+		files = get_log_files(self.prefix)
+		self.assertGreater(len(files), 5)
+		self.assertEqual(recorder.get_stats()['files'], len(files))
+		for path in files:
+			with self.subTest(path=path):
+				self.assertLessEqual(os.path.getsize(path), 1024)
+
+		records = self._read_all()
+		self.assertEqual([frame for timestamp, flags, frame in records], frames)
+
+		start, end = records[50][0], records[150][0]
+		sliced = self._read_all(start, end)
+		self.assertEqual(sliced, [record for record in records if start <= record[0] < end])
+
+		# appended to the existing log
+		recorder = FrameRecorder(self.prefix)
+		recorder.record('{"e":"tick"}')
+		recorder.close()
+		self.assertEqual(len(get_log_files(self.prefix)), len(files) + 1)
+		self.assertEqual(self._read_all()[-1][2], '{"e":"tick"}')
+
+		# appended after the last file, with older ones removed
+		files = get_log_files(self.prefix)
+		sizes = [os.path.getsize(path) for path in files]
+		os.remove(files[0])
+		recorder = FrameRecorder(self.prefix)
+		recorder.record('{"e":"md"}')
+		recorder.close()
+		self.assertEqual([os.path.getsize(path) for path in files[1:]], sizes[1:])
+		self.assertEqual(get_log_files(self.prefix)[:-1], files[1:])
+		self.assertEqual(self._read_all()[-1][2], '{"e":"md"}')
+
+	def test_dropped(self):
+		recorder = FrameRecorder(self.prefix, max_pending=2, flush_interval=60)
+		for _ in range(5):
+			recorder.record('{}')
+		recorder.close()
+		self.assertEqual(recorder.get_stats()['dropped'], 3)
+		self.assertEqual(len(self._read_all()), 2)
+
+	def test_config(self):
+		with self.assertRaises(ConfigError):
+			FrameRecorder(self.prefix, max_bytes=0)
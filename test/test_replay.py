@@ -0,0 +1,105 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from cexio.exceptions import *
+from cexio.messaging import *
+from cexio.recorder import *
+from cexio.replay import *
+from cexio.ws_client import *
+
+
+class FrameReplayTestCase(unittest.TestCase):
+
+	config = {'ws': {'uri': 'ws://localhost/', }, 'authorize': False, }
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.prefix = os.path.join(self.directory, 'session')
+		self.routed = []
+
+		async def handler(message):
+			self.routed.append(message)
+			return message
+
+		self.client = CommonWebSocketClient(self.config)
+		self.client.set_router(MessageRouter((({'e': 'tick', }, handler), ), sink=handler))
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def _record(self, frames, interval=0, **kwargs):
+		recorder = FrameRecorder(self.prefix, outbound=True, **kwargs)
+		for frame, flags in frames:
+			recorder.record(frame, flags)
+			if interval:
+				time.sleep(interval)
+		recorder.close()
+
+	def _replay(self, **kwargs):
+		loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		try:
+			replay = FrameReplay(self.prefix, self.client, **kwargs)
+			return loop.run_until_complete(replay.run())
+		finally:
+			loop.close()
+
+	def test_replay(self):
+		self._record((
+			('{"e":"connected"}', INBOUND),
+			('{"e":"ticker","oid":"1"}', OUTBOUND),
+			('{"e":"tick","n":1}', INBOUND),
+			('{"e":"ping","time":1}', INBOUND),
+			('{"e":"tick"', INBOUND),
+			(b'{"e":"md","n":2}', INBOUND),
+		))
+		stats = self._replay()
+
+		# special messages are not routed, nor handled
+		self.assertEqual(self.routed, [{'e': 'tick', 'n': 1, }, {'e': 'md', 'n': 2, }])
+		self.assertEqual(self.client.get_stats()['outbound']['depth'], 0)
+		self.assertEqual((stats['frames'], stats['skipped'], stats['errors']), (4, 1, 1))
+		self.assertGreater(stats['frames_per_s'], 0)
+
+	def test_time_range(self):
+		self._record(((('{{"e":"tick","n":{}}}'.format(n)), INBOUND) for n in range(200)),
+					 max_bytes=1024, index_interval=4)
+		self.assertGreater(len(get_log_files(self.prefix)), 5)
+		records = list(read_log(self.prefix))
+		origin = records[0][0]
+
+		start, end = (records[50][0] - origin) / 1e9, (records[150][0] - origin) / 1e9
+		stats = self._replay(start=start, end=end)
+		start_ns, end_ns = origin + int(start * 1000000000), origin + int(end * 1000000000)
+		expected = [n for n, (timestamp, flags, frame) in enumerate(records) if start_ns <= timestamp < end_ns]
+		self.assertGreater(len(expected), 90)
+		self.assertEqual([message['n'] for message in self.routed], expected)
+		self.assertEqual(stats['frames'], len(expected))
+
+	def test_speed(self):
+		self._record(((('{{"e":"tick","n":{}}}'.format(n)), INBOUND) for n in range(5)), interval=0.02)
+		span = self._replay()['span']
+		self.assertGreaterEqual(span, 0.08)
+
+		for speed in (1, 4):
+			with self.subTest(speed=speed):
+				del self.routed[:]
+				stats = self._replay(speed=speed)
+				self.assertEqual(len(self.routed), 5)
+				self.assertGreaterEqual(stats['elapsed'], span / speed * 0.95)
+				self.assertLess(stats['elapsed'], span / speed + 0.5)
+
+	def test_invalid(self):
+		with self.assertRaises(ConfigError):
+			FrameReplay(self.prefix, self.client)
+		self._record((('{"e":"tick"}', INBOUND), ))
+		with self.assertRaises(ConfigError):
+			FrameReplay(self.prefix, self.client, speed=0)
+
+
+if __name__ == '__main__':
+	unittest.main()
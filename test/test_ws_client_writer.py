@@ -0,0 +1,613 @@
+import asyncio
+import unittest
+
+from cexio.codec import *
+from cexio.exceptions import *
+from cexio.messaging import *
+from cexio.metrics import monotonic_ns
+from cexio.queues import *
+from cexio.ws_client import *
+
+
+class FakeTransport(object):
+
+	def __init__(self):
+		self.aborted = False
+
+	def abort(self):
+		self.aborted = True
+
+
+class FakeWebSocket(object):
+	# Records written frames, fails writing after given number of frames, receives frames put to inbound
+
+	def __init__(self, fail_after=None, on_frame=None, pong=True):
+		self.inbound = asyncio.Queue()
+		self.frames = []
+		self.writes = 0
+		self.fail_after = fail_after
+		self.on_frame = on_frame
+		self.pong = pong
+		self.pings = 0
+		self.transport = FakeTransport()
+
+	async def send(self, frame):
+		if self.fail_after is not None and self.writes >= self.fail_after:
+			raise ConnectionError('closed')
+		self.writes += 1
+		self.frames.append(frame)
+		if self.on_frame is not None:
+			self.on_frame(frame)
+
+	async def recv(self):
+		return await self.inbound.get()
+
+	async def close(self):
+		self.fail_after = self.writes
+
+	async def ping(self):
+		# Returns pong waiter, done if pong is on
+		self.pings += 1
+		pong = asyncio.Future()
+		if self.pong:
+			asyncio.get_event_loop().call_later(0.001, pong.set_result, None)
+		return pong
+
+
+class SlowClosingWebSocket(FakeWebSocket):
+
+	async def close(self):
+		await asyncio.sleep(0.05)
+		await super().close()
+
+
+class WriterTestCase(unittest.TestCase):
+
+	def _init_client(self, ws):
+		client = CommonWebSocketClient({'ws': {'uri': 'ws://localhost/', }, 'authorize': False, })
+		client._send_batch_size = 2
+		client.ws = ws
+		# started as by run(), with no connection
+		client._outbound_ready = asyncio.Event()
+		client._writable = asyncio.Event()
+		client._writer_task = asyncio.ensure_future(client._writing())
+		return client
+
+	async def _stop(self, client):
+		client._writer_task.cancel()
+		try:
+			await client._writer_task
+		except asyncio.CancelledError:
+			pass
+
+	def _init_pipelined_client(self, fail_pair=None):
+		# Responds to each request after a delay, keeping track of requests in flight
+		resolver = RequestResponseFutureResolver(name='', op_name_get_path='e',
+												 key_set_path='oid', key_get_path='oid', instrument=True)
+		self.in_flight = 0
+		self.max_in_flight = 0
+
+		def validator(message):
+			if message['ok'] == 'error':
+				raise ErrorMessage(message['data']['error'])
+			return message['data']
+
+		async def respond(request):
+			await asyncio.sleep(0.01)
+			self.in_flight -= 1
+			if request['data']['pair'] == fail_pair:
+				response = {'e': request['e'], 'oid': request['oid'], 'ok': 'error', 'data': {'error': 'Bad pair'}, }
+			else:
+				response = {'e': request['e'], 'oid': request['oid'], 'ok': 'ok', 'data': request['data'], }
+			await client._router(response)
+
+		def on_frame(frame):
+			request = client._codec.loads(frame)
+			if 'oid' in request:
+				self.in_flight += 1
+				self.max_in_flight = max(self.max_in_flight, self.in_flight)
+				asyncio.ensure_future(respond(request))
+
+		client = self._init_client(FakeWebSocket(on_frame=on_frame))
+		client.set_router(MessageRouter((({'e': None, 'oid': None, 'ok': None, }, resolver + validator), )))
+		client.set_resolver(resolver)
+		client._writable.set()
+		return client
+
+	def _requests(self, count):
+		return [{'e': 'ticker', 'data': {'pair': str(n), }, } for n in range(count)]
+
+
+class OutboundQueueTestCase(WriterTestCase):
+
+	async def _test_batches(self):
+		ws = FakeWebSocket()
+		client = self._init_client(ws)
+		client._writable.set()
+		await asyncio.gather(*(client.send({'e': 'ping', 'n': n, }) for n in range(5)))
+		self.assertEqual(ws.frames, ['{{"e":"ping","n":{}}}'.format(n) for n in range(5)])
+		stats = client.get_stats()['outbound']
+		self.assertEqual((stats['depth'], stats['sent'], stats['batches']), (0, 5, 3))
+		await self._stop(client)
+
+	async def _test_queued_while_not_writable(self):
+		ws = FakeWebSocket()
+		client = self._init_client(ws)
+		sends = [asyncio.ensure_future(client.send('m{}'.format(n))) for n in range(3)]
+		await asyncio.sleep(0.01)
+		self.assertEqual(ws.frames, [])
+		self.assertFalse(any(send.done() for send in sends))
+		client._writable.set()
+		await asyncio.gather(*sends)
+		self.assertEqual(ws.frames, ['m0', 'm1', 'm2'])
+		await self._stop(client)
+
+	async def _test_send_error(self):
+		ws = FakeWebSocket(fail_after=1)
+		client = self._init_client(ws)
+		client._writable.set()
+		sends = [asyncio.ensure_future(client.send('m{}'.format(n))) for n in range(3)]
+		await asyncio.sleep(0.01)
+		self.assertIsInstance(sends[0].result(), int)  # time written
+		with self.assertRaises(ConnectivityError):
+			sends[1].result()
+		self.assertEqual(client._connection_lost, 'while sending: closed')
+		self.assertFalse(client._writable.is_set())
+
+		# the rest is written after reconnect
+		self.assertFalse(sends[2].done())
+		client.ws = FakeWebSocket()
+		client._writable.set()
+		await sends[2]
+		self.assertEqual(client.ws.frames, ['m2'])
+		self.assertEqual(client.get_stats()['outbound']['failed'], 1)
+		await self._stop(client)
+
+	async def _test_encode_error(self):
+		ws = FakeWebSocket()
+		client = self._init_client(ws)
+		client._writable.set()
+		with self.assertRaises(TypeError):
+			await client.send({'e': object(), })
+		await client.send('m')
+		self.assertEqual(ws.frames, ['m'])
+		await self._stop(client)
+
+	async def _test_send_timeout(self):
+		ws = FakeWebSocket()
+		client = self._init_client(ws)
+		client._timeout = 0.02
+		loop = asyncio.get_event_loop()
+		start = loop.time()
+		with self.assertRaises(asyncio.TimeoutError):
+			await asyncio.wait_for(client.send('m'), 1)
+		self.assertLess(loop.time() - start, 0.5)
+
+		# not written after the timeout
+		client._writable.set()
+		await asyncio.sleep(0.01)
+		self.assertEqual(ws.frames, [])
+		await self._stop(client)
+
+	def test_async(self):
+		loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		for test in (self._test_batches, self._test_queued_while_not_writable,
+					 self._test_send_error, self._test_encode_error, self._test_send_timeout):
+			with self.subTest(test=test.__name__):
+				loop.run_until_complete(test())
+		loop.close()
+
+
+class RequestPipelineTestCase(WriterTestCase):
+
+	async def _test_gather(self):
+		client = self._init_pipelined_client()
+		results = await client.request_pipelined(self._requests(10), window=4).gather()
+		self.assertEqual(results, [{'pair': str(n), } for n in range(10)])
+		self.assertEqual(self.max_in_flight, 4)
+		self.assertEqual(client.get_stats()['rtt']['count'], 10)
+		ticker = client.get_request_stats()['ops']['ticker']
+		self.assertEqual(ticker['requests'], 10)
+		self.assertEqual(ticker['wire']['count'], 10)
+		self.assertGreaterEqual(ticker['wire']['p50'], 10 ** 7)  # responded in 10 ms
+		await self._stop(client)
+
+	async def _test_gather_error(self):
+		# no requests are sent after the first error
+		client = self._init_pipelined_client(fail_pair='1')
+		with self.assertRaises(ErrorMessage):
+			await client.request_pipelined(self._requests(5), window=1).gather()
+		await asyncio.sleep(0.05)
+		self.assertEqual(len(client.ws.frames), 2)
+		await self._stop(client)
+
+	async def _test_cancel(self):
+		client = self._init_pipelined_client()
+		pipeline = client.request_pipelined(self._requests(10), window=2)
+		done = []
+		async for index, future in pipeline:
+			done.append(index)
+			pipeline.cancel()
+		# the requests admitted until cancel() are done
+		self.assertLess(len(done), 10)
+		self.assertEqual(len(client.ws.frames), len(done))
+		await self._stop(client)
+
+	async def _test_iterate(self):
+		client = self._init_pipelined_client(fail_pair='1')
+		done = {}
+		async for index, future in client.request_pipelined(self._requests(5), window=3):
+			done[index] = future
+		self.assertEqual(sorted(done), list(range(5)))
+		with self.assertRaises(ErrorMessage):
+			done[1].result()
+		self.assertEqual(done[4].result(), {'pair': '4', })
+		await self._stop(client)
+
+	async def _test_timeout(self):
+		client = self._init_pipelined_client()
+		client._timeout = 0.001
+		with self.assertRaises(asyncio.TimeoutError):
+			await client.request_pipelined(self._requests(2)).gather()
+		self.assertEqual(client.get_request_stats()['ops']['ticker']['timeouts'], 2)
+		await asyncio.sleep(0.05)
+		await self._stop(client)
+
+	async def _test_request_timeout(self):
+		# the request is not written within timeout
+		client = self._init_pipelined_client()
+		client._writable.clear()
+		client._timeout = 0.02
+		loop = asyncio.get_event_loop()
+		start = loop.time()
+		with self.assertRaises(asyncio.TimeoutError):
+			await asyncio.wait_for(client.request(self._requests(1)[0]), 1)
+		self.assertLess(loop.time() - start, 0.5)
+		self.assertEqual(client.get_request_stats()['ops']['ticker']['timeouts'], 1)
+		client._writable.set()
+		await asyncio.sleep(0.01)
+		self.assertEqual(client.ws.frames, [])
+
+		# written late, the time written counts against timeout
+		client._writable.clear()
+		client._timeout = 0.1
+		loop.call_later(0.095, client._writable.set)
+		with self.assertRaises(asyncio.TimeoutError):
+			await client.request(self._requests(1)[0])
+		await asyncio.sleep(0.02)
+		await self._stop(client)
+
+	async def _test_template(self):
+		client = self._init_pipelined_client()
+		template = RequestTemplate({'e': 'ticker', 'data': {'pair': None, }, }, key_path='oid', fields=('data/pair', ))
+		self.assertEqual(await client.request(template, 'BTC:USD'), {'pair': 'BTC:USD', })
+
+		template = RequestTemplate({'e': 'ticker', 'data': {'pair': 'BTC:USD', }, }, key_path='oid')
+		results = await client.request_pipelined([template] * 3).gather()
+		self.assertEqual(results, [{'pair': 'BTC:USD', }] * 3)
+		self.assertEqual(len(client._resolver), 0)
+
+		# with no key_path, not sent
+		written = len(client.ws.frames)
+		template = RequestTemplate({'e': 'ticker', 'data': {'pair': None, }, }, fields=('data/pair', ))
+		with self.assertRaises(ConfigError):
+			await client.request(template, 'BTC:USD')
+		with self.assertRaises(ConfigError):
+			await client.request_pipelined([template]).gather()
+		self.assertEqual(len(client.ws.frames), written)
+		self.assertEqual(len(client._resolver), 0)
+		await self._stop(client)
+
+	def test_async(self):
+		loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		for test in (self._test_gather, self._test_gather_error, self._test_cancel, self._test_iterate,
+					 self._test_timeout, self._test_request_timeout,
+					 self._test_template):
+			with self.subTest(test=test.__name__):
+				loop.run_until_complete(test())
+		loop.close()
+
+	def test_config(self):
+		with self.assertRaises(ConfigError):
+			RequestPipeline(None, (), 0)
+
+
+class ReconnectTestCase(WriterTestCase):
+
+	def test_reconnect_delay(self):
+		client = CommonWebSocketClient({'ws': {'uri': 'ws://localhost/', }, 'authorize': False, })
+		client._reconnect_delay, client._reconnect_max_delay = 0.1, 30
+		for attempt, delay in ((0, 0.1), (1, 0.2), (5, 3.2), (9, 30), (100, 30)):
+			with self.subTest(attempt=attempt):
+				for _ in range(20):
+					self.assertTrue(delay / 2 <= client._get_reconnect_delay(attempt) <= delay)
+
+	async def _test_resubscribe(self):
+		client = self._init_pipelined_client()
+		client._send_subscriptions = [{'e': 'subscribe', 'rooms': ['pair-{}'.format(n)], } for n in range(3)]
+		client._request_subscriptions = self._requests(5)
+		client._resubscribe_window = 2
+		client._disconnected_at = monotonic_ns()
+		client._on_reconnect_phase('connected')
+
+		await client._after_connected()
+		self.assertEqual(len(client.ws.frames), 8)
+		self.assertEqual(self.max_in_flight, 2)
+		stats = client.get_stats()['reconnects']
+		self.assertEqual(stats['count'], 1)
+		self.assertEqual(sorted(stats['last']), ['connected', 'resubscribed'])
+		self.assertLessEqual(stats['last']['connected'], stats['last']['resubscribed'])
+		self.assertEqual(stats['timeline']['resubscribed']['count'], 1)
+		self.assertEqual(stats['timeline']['authed']['count'], 0)
+		await self._stop(client)
+
+	async def _test_resend_requests(self):
+		client = self._init_pipelined_client()
+		responding = client.ws
+		client.ws = FakeWebSocket()  # written requests are lost
+		ticker = asyncio.ensure_future(client.request({'e': 'ticker', 'data': {'pair': 'BTC:USD', }, }))
+		order = asyncio.ensure_future(client.request({'e': 'place-order', 'data': {'pair': 'BTC:USD', }, }))
+		await asyncio.sleep(0.01)
+		self.assertEqual(len(client.ws.frames), 2)
+
+		# connection lost, with a request not written yet
+		client._writable.clear()
+		balance = asyncio.ensure_future(client.request(
+			{'e': 'get-balance', 'data': {'pair': 'BTC:USD', }, }, idempotent=False))
+		await asyncio.sleep(0)
+		client._on_requests_lost()
+		await asyncio.sleep(0.01)
+		with self.assertRaises(ConnectivityError):
+			order.result()
+		self.assertFalse(ticker.done())
+
+		# reconnected
+		client.ws = responding
+		client._writable.set()
+		client._resend_requests_lost()
+		self.assertEqual(await ticker, {'pair': 'BTC:USD', })
+		self.assertEqual(await balance, {'pair': 'BTC:USD', })
+		self.assertEqual(len(responding.frames), 2)
+		self.assertEqual(client.get_stats()['requests'], {'pending': 0, 'failed': 1, })
+		await self._stop(client)
+
+	async def _test_resend_subscription(self):
+		# subscription request in flight is resent as written, and requested again on resubscribe
+		client = self._init_pipelined_client()
+		responding = client.ws
+		client.ws = FakeWebSocket()  # written requests are lost
+		subscribe = asyncio.ensure_future(client.request_subscribe(
+			{'e': 'order-book-subscribe', 'data': {'pair': 'BTC:USD', }, }))
+		await asyncio.sleep(0.01)
+		oid = client._codec.loads(client.ws.frames[0])['oid']
+
+		client._writable.clear()
+		client._on_requests_lost()
+		client.ws = responding
+		client._writable.set()
+		await client._after_connected()
+		self.assertEqual(await asyncio.wait_for(subscribe, 1), {'pair': 'BTC:USD', })
+		oids = [client._codec.loads(frame)['oid'] for frame in responding.frames]
+		self.assertEqual(len(oids), 2)
+		self.assertEqual(oids[0], oid)
+		self.assertNotEqual(oids[1], oid)
+		await self._stop(client)
+
+	async def _test_requests_lost_not_reconnecting(self):
+		client = self._init_pipelined_client()
+		client._reconnect = False
+		client.ws = FakeWebSocket()  # written requests are lost
+		ticker = asyncio.ensure_future(client.request({'e': 'ticker', 'data': {'pair': 'BTC:USD', }, }))
+		await asyncio.sleep(0.01)
+		self.assertEqual(len(client.ws.frames), 1)
+
+		# connection lost, with a request not written yet
+		client._writable.clear()
+		balance = asyncio.ensure_future(client.request({'e': 'get-balance', 'data': {'pair': 'BTC:USD', }, }))
+		await asyncio.sleep(0)
+		client._on_requests_lost()
+		await asyncio.wait((ticker, balance), timeout=1)
+		for request in (ticker, balance):
+			with self.assertRaises(ConnectivityError):
+				request.result()
+		self.assertIn('not sent', str(balance.exception()))
+		self.assertEqual(client.get_stats()['requests'], {'pending': 0, 'failed': 2, })
+		await self._stop(client)
+
+	async def _test_timeline(self):
+		# the timeline starts when the connection is lost, before it is closed
+		async def handler(message):
+			return message
+
+		async def connect():
+			client.ws = FakeWebSocket()
+			client._on_reconnect_phase('connected')
+
+		client = self._init_client(SlowClosingWebSocket())
+		client.set_router(MessageRouter((({'e': None, }, handler), )))
+		client._last_recv_time = asyncio.get_event_loop().time()
+		client._writable.set()
+		client._reconnect_delay = 0.001
+		client.connect = connect
+		client._routing_on = asyncio.ensure_future(client._routing())
+		await asyncio.sleep(0.01)
+
+		client._on_connection_lost("by test")
+		await asyncio.sleep(0.1)
+		stats = client.get_stats()['reconnects']
+		self.assertEqual(stats['count'], 1)
+		self.assertGreaterEqual(stats['last']['connected'], 5 * 10 ** 7)  # closed in 50 ms
+		self.assertGreaterEqual(stats['last']['resubscribed'], stats['last']['connected'])
+		await client.stop()
+
+	def test_async(self):
+		loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		for test in (self._test_resubscribe, self._test_resend_requests, self._test_resend_subscription,
+					 self._test_requests_lost_not_reconnecting,
+					 self._test_timeline):
+			with self.subTest(test=test.__name__):
+				loop.run_until_complete(test())
+		loop.close()
+
+
+class RoutingTestCase(WriterTestCase):
+
+	def _init_routed_client(self, ws, handler):
+		client = self._init_client(ws)
+		client.set_router(MessageRouter((({'e': None, }, handler), )))
+		client._last_recv_time = asyncio.get_event_loop().time()
+		client._writable.set()
+		client._routing_on = asyncio.ensure_future(client._routing())
+		return client
+
+	async def _test_cancelled_in_handler(self):
+		received = []
+
+		async def handler(message):
+			if message['e'] == 'cancel':
+				raise asyncio.CancelledError()
+			received.append(message)
+			return message
+
+		ws = FakeWebSocket()
+		client = self._init_routed_client(ws, handler)
+		for frame in ('{"e":"tick"}', '{"e":"cancel"}', '{"e":"md"}'):
+			ws.inbound.put_nowait(frame)
+		await asyncio.sleep(0.01)
+		self.assertEqual([message['e'] for message in received], ['tick', 'md'])
+		self.assertFalse(client._routing_on.done())
+		await client.stop()
+
+	async def _test_routing_cancelled(self):
+		async def handler(message):
+			return message
+
+		client = self._init_routed_client(FakeWebSocket(), handler)
+		await asyncio.sleep(0.01)
+		listener_task = client._listener_task
+		client._routing_on.cancel()
+		await asyncio.wait((client._routing_on, ), timeout=1)
+		self.assertTrue(client._routing_on.cancelled())
+		self.assertTrue(listener_task.cancelled())
+		self.assertIs(client._listener_task, listener_task)  # no new reader started
+		await self._stop(client)
+
+	async def _test_stopped_on_connection_lost(self):
+		async def handler(message):
+			return message
+
+		client = self._init_routed_client(FakeWebSocket(), handler)
+		client._reconnect = False
+		client._writable.clear()
+		send = asyncio.ensure_future(client.send('m'))
+		await asyncio.sleep(0.01)
+
+		client._on_connection_lost("by test")
+		await asyncio.wait((client._routing_on, ), timeout=1)
+		self.assertTrue(client._routing_on.done())
+		with self.assertRaises(ConnectivityError):
+			send.result()
+		self.assertEqual(client.get_stats()['outbound']['depth'], 0)
+
+		# not queued, fails at once on the closed connection
+		with self.assertRaises(ConnectivityError):
+			await asyncio.wait_for(client.send('m'), 1)
+		await client.stop()
+
+	async def _test_ingress(self):
+		# events are queued, dropped by the policy, special messages and responses are routed at once
+		released = asyncio.Event()
+		ticks = []
+
+		async def on_tick(message):
+			await released.wait()
+			ticks.append(message['n'])
+			return message
+
+		ws = FakeWebSocket()
+		resolver = RequestResponseFutureResolver(name='', op_name_get_path='e', key_set_path='oid', key_get_path='oid')
+		client = self._init_client(ws)
+		client.set_resolver(resolver)
+		client._ingress = IngressQueue(1, policy=DROP_OLDEST)
+		client._dispatcher_task = asyncio.ensure_future(client._dispatching())
+		client._last_recv_time = asyncio.get_event_loop().time()
+		client._writable.set()
+		client.set_router(MessageRouter((
+			({'e': 'tick', }, on_tick),
+			({'e': None, 'oid': None, 'ok': None, }, resolver),
+		)))
+		client._routing_on = asyncio.ensure_future(client._routing())
+
+		request = asyncio.ensure_future(client.request({'e': 'ticker', 'data': {}, }))
+		await asyncio.sleep(0.01)
+		oid = client._codec.loads(ws.frames[0])['oid']
+		for frame in ('{"e":"tick","n":1}', '{"e":"tick","n":2}', '{"e":"tick","n":3}', '{"e":"ping"}',
+					  '{{"e":"ticker","oid":"{}","ok":"ok","data":{{}}}}'.format(oid), '{"e":"tick","n":4}'):
+			ws.inbound.put_nowait(frame)
+		await asyncio.sleep(0.01)
+		self.assertEqual((await asyncio.wait_for(request, 1))['oid'], oid)
+		self.assertEqual(ws.frames[1], '{"e":"pong"}')
+		self.assertEqual(ticks, [])
+
+		released.set()
+		await asyncio.sleep(0.01)
+		self.assertEqual(ticks, [3, 4])
+		self.assertEqual(client.get_stats()['ingress']['dropped'], 2)
+		await client.stop()
+
+	def test_async(self):
+		loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		for test in (self._test_cancelled_in_handler, self._test_routing_cancelled,
+					 self._test_stopped_on_connection_lost, self._test_ingress):
+			with self.subTest(test=test.__name__):
+				loop.run_until_complete(test())
+		loop.close()
+
+
+class KeepaliveTestCase(WriterTestCase):
+
+	def _init_watched_client(self, ws):
+		client = self._init_client(ws)
+		client._keepalive_after = 0.01
+		client._keepalive_timeout = 0.02
+		client._last_recv_time = asyncio.get_event_loop().time()
+		return client
+
+	async def _test_alive(self):
+		client = self._init_watched_client(FakeWebSocket())
+		watchdog = asyncio.ensure_future(client._watching())
+		await asyncio.sleep(0.1)
+		self.assertFalse(watchdog.done())
+		self.assertIsNone(client._connection_lost)
+		self.assertFalse(client.ws.transport.aborted)
+		stats = client.get_stats()['keepalive']
+		self.assertGreater(stats['pings'], 1)
+		self.assertEqual(client.get_rtt(), stats['rtt'])
+		self.assertGreater(client.get_rtt(), 0)
+		watchdog.cancel()
+		await self._stop(client)
+
+	async def _test_dead(self):
+		client = self._init_watched_client(FakeWebSocket(pong=False))
+		await asyncio.wait_for(client._watching(), 0.1)
+		self.assertEqual(client._connection_lost, 'by keepalive: TimeoutError')
+		self.assertTrue(client.ws.transport.aborted)
+		self.assertEqual(client.ws.pings, 1)
+		self.assertIsNone(client.get_rtt())
+		await self._stop(client)
+
+	def test_async(self):
+		loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		for test in (self._test_alive, self._test_dead):
+			with self.subTest(test=test.__name__):
+				loop.run_until_complete(test())
+		loop.close()
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from cexio.exceptions import *
+from cexio.messaging import *
+from cexio.ws_pool import *
+
+
+class WebSocketClientPoolTestCase(unittest.TestCase):
+
+	config = {'ws': {'uri': 'ws://localhost/', }, 'authorize': False, }
+
+	pairs = ('BTC-USD', 'ETH-USD', 'BTC-EUR', 'ETH-EUR', 'LTC-USD', 'BCH-USD', 'XRP-USD', 'BTC-GBP', )
+
+	def test_subscription_pair(self):
+		for message, pair in (
+				({'e': 'order-book-subscribe', 'data': {'pair': ['BTC', 'USD'], 'depth': 10, }, 'oid': '1', }, 'BTC-USD'),
+				({'e': 'subscribe', 'rooms': ['pair-BTC-USD'], }, 'BTC-USD'),
+				({'e': 'init-ohlcv', 'i': '1m', 'rooms': ['pair-ETH-EUR'], }, 'ETH-EUR'),
+				({'e': 'ticker', 'data': {'pair': 'BTC:USD', }, }, 'BTC-USD'),
+				({'e': 'subscribe', 'rooms': ['tickers'], }, None),
+				({'e': 'get-balance', 'data': {}, }, None), ):
+			with self.subTest(message=message):
+				self.assertEqual(get_subscription_pair(message), pair)
+
+	def _subscribe(self, pool, pair):
+		# saved as by send_subscribe(), with no connection
+		message = {'e': 'subscribe', 'rooms': ['pair-{}'.format(pair)], }
+		member = pool.place(message)
+		member._send_subscriptions.append(message)
+		return member
+
+	def test_hash_placement(self):
+		pool = WebSocketClientPool(self.config, 3, policy=HASH)
+		members = {pair: self._subscribe(pool, pair) for pair in self.pairs}
+		for pair in self.pairs:
+			with self.subTest(pair=pair):
+				message = {'e': 'order-book-subscribe', 'data': {'pair': pair.split('-'), }, }
+				self.assertIs(pool.place(message), members[pair])
+		self.assertGreater(len(set(members.values())), 1)
+
+		# no pair - least loaded
+		least_loaded = min(pool.members, key=lambda member: len(member._send_subscriptions))
+		self.assertIs(pool.place({'e': 'subscribe', 'rooms': ['tickers'], }), least_loaded)
+
+	def test_least_loaded_placement(self):
+		pool = WebSocketClientPool(self.config, 3, policy=LEAST_LOADED)
+		for pair in self.pairs[:6]:
+			self._subscribe(pool, pair)
+		self.assertEqual([stats['subscriptions'] for stats in pool.get_stats()['members']], [2, 2, 2])
+
+	def test_shared_router(self):
+		async def handler(message):
+			return message
+
+		pool = WebSocketClientPool(self.config, 2)
+		router = MessageRouter((({'e': 'tick', }, handler), ))
+		resolver = RequestResponseFutureResolver(name='', key_set_path='oid', key_get_path='oid')
+		pool.set_router(router)
+		pool.set_resolver(resolver)
+		for member in pool.members:
+			with self.subTest(member=member):
+				self.assertIs(member._router.get_sink(), router)
+				self.assertIs(member._resolver, resolver)
+
+	def test_config(self):
+		with self.assertRaises(ConfigError):
+			WebSocketClientPool(self.config, 0)
+		with self.assertRaises(ConfigError):
+			WebSocketClientPool(self.config, 2, policy='unknown')